@@ -0,0 +1,110 @@
+import sys
+import json
+import time
+import ctypes
+import logging
+import platform
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+def get_peak_rss() -> int:
+    """
+    Returns the peak resident set size of the current process, in bytes.
+    """
+    if sys.platform == 'win32':
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+
+    import resource
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+def _measure(function, args : tuple, quiet : bool) -> dict:
+    if quiet:
+        logging.disable(logging.INFO)
+    start = time.perf_counter()
+    result = function(*args) or {}
+    elapsed = time.perf_counter() - start
+    result["seconds"] = elapsed
+    result["peak_rss_mb"] = get_peak_rss() / (1024 * 1024)
+    if result.get("entries"):
+        result["entries_per_s"] = result["entries"] / elapsed
+    if result.get("bytes"):
+        result["mb_per_s"] = result["bytes"] / (1024 * 1024) / elapsed
+    if result.get("pixels"):
+        result["mp_per_s"] = result["pixels"] / 1e6 / elapsed
+    return result
+
+def run_isolated(function, *args, quiet : bool = True) -> dict:
+    """
+    Runs function(*args) in a fresh worker process so the reported peak RSS only belongs to that stage.
+    function may return a dict with "entries", "bytes" and "pixels" counts, which are turned into throughput figures.
+    """
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(_measure, function, args, quiet).result()
+
+def get_run_metadata(**params) -> dict:
+    return {
+        "date" : datetime.now().isoformat(timespec='seconds'),
+        "python" : platform.python_version(),
+        "platform" : platform.platform(),
+        "machine" : platform.machine(),
+        "params" : params,
+    }
+
+def save_results(results : dict, output_path : Path):
+    with open(output_path, mode='w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
+
+def print_results(results : dict):
+    for stage, metrics in results["results"].items():
+        line = f"{stage:<32}"
+        for key in ["seconds", "entries_per_s", "mb_per_s", "mp_per_s", "peak_rss_mb"]:
+            if key in metrics:
+                line += f" {key}={metrics[key]:.3f}"
+        print(line)
+
+# metrics for which a smaller value is an improvement
+LOWER_IS_BETTER = {"seconds", "peak_rss_mb"}
+
+def print_comparison(results : dict, baseline_path : Path):
+    """
+    Prints the improvement of each metric of results against a previously saved run, so that > 1 always means the current
+    run is better: the new/old ratio for the throughputs (entries_per_s, mb_per_s, mp_per_s), and the old/new ratio
+    for the metrics where lower is better (seconds, peak_rss_mb).
+    """
+    with open(baseline_path, mode='r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    for stage, metrics in results["results"].items():
+        if stage not in baseline["results"]:
+            continue
+        line = f"{stage:<32}"
+        for key in ["seconds", "entries_per_s", "mb_per_s", "mp_per_s", "peak_rss_mb"]:
+            old_value = baseline["results"][stage].get(key)
+            if key not in metrics or not old_value:
+                continue
+            if key in LOWER_IS_BETTER:
+                if metrics[key]:
+                    line += f" {key}={old_value / metrics[key]:.2f}x"
+            else:
+                line += f" {key}={metrics[key] / old_value:.2f}x"
+        print(line)
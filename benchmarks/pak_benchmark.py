@@ -0,0 +1,178 @@
+"""
+Pak read/write benchmark.
+
+Generates a deterministic synthetic pak (many tiny files, a few huge ones, compressible and incompressible data,
+stored/deflate/zstd entries) and measures REPak opening, unpacking, streaming, building and path hashing.
+
+Usage (from the repository root):
+    python -m benchmarks.pak_benchmark --work-dir bench_pak --output pak_results.json
+    python -m benchmarks.pak_benchmark --work-dir bench_pak --compare pak_results.json
+"""
+import sys
+import zlib
+import zstd
+import shutil
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from req.AJTTools.plugins.pak.src.Pak import REPak, build_pak_from_dir, scan_pak_dir, get_mmh3_hashes
+from req.AJTTools.plugins.pak.src.PakEntry import PakEntry
+from req.AJTTools.io import LittleEndianBinaryFileWriter
+from benchmarks.common import run_isolated, get_run_metadata, save_results, print_results, print_comparison
+
+COMPRESSIBLE_WORDS = [b"Phoenix", b"Wright", b"Objection!", b"Hold it!", b"Take that!", b"evidence", b"testimony", b"court", b"record", b"\x00\x00\x00\x00", b"\x01\x00\x02\x00"]
+COMPRESSION_FLAGS = [0, 1, 2] # stored, deflate, zstd
+
+def generate_data(rng : random.Random, size : int, compressible : bool) -> bytes:
+    if not compressible:
+        return rng.randbytes(size)
+    chunk = b" ".join(rng.choice(COMPRESSIBLE_WORDS) for _ in range(8192))
+    return (chunk * (size // len(chunk) + 1))[:size]
+
+def compress_data(data : bytes, compression_flag : int) -> bytes:
+    if compression_flag == 1:
+        return zlib.compress(data, wbits=-15)
+    elif compression_flag == 2:
+        return zstd.compress(data)
+    return data
+
+def generate_synthetic_pak(work_dir : Path, seed : int = 0, tiny_count : int = 5000, huge_count : int = 3, huge_size : int = 32 * 1024 * 1024) -> dict:
+    """
+    Writes work_dir/source (a natives/ tree usable by build_pak_from_dir), work_dir/synthetic.pak and
+    work_dir/synthetic.list (its release list). The same seed always produces the same files.
+    """
+    rng = random.Random(seed)
+    source_dir = work_dir / 'source'
+    pak_path = work_dir / 'synthetic.pak'
+    release_list_path = work_dir / 'synthetic.list'
+    if source_dir.exists():
+        shutil.rmtree(source_dir)
+
+    files = []
+    for idx in range(tiny_count):
+        size = rng.randint(16, 4096)
+        gamepath = f"natives/stm/bench/tiny/{idx // 256:03d}/file_{idx:06d}.user.2"
+        files.append((gamepath, generate_data(rng, size, rng.random() < 0.7)))
+    for idx in range(huge_count):
+        gamepath = f"natives/stm/bench/huge/file_{idx:02d}.tex.143221013"
+        files.append((gamepath, generate_data(rng, huge_size, idx % 2 == 0)))
+
+    with LittleEndianBinaryFileWriter(pak_path) as f:
+        f.write(b'KPKA')
+        f.writeint32(4)
+        f.writeint32(len(files))
+        f.write(b'FLAG')
+        f.write(b'\x00' * (0x30 * len(files)))
+        offset = 0x10 + 0x30 * len(files)
+        for idx, (gamepath, data) in enumerate(files):
+            filepath = source_dir / gamepath
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            filepath.write_bytes(data)
+
+            entry = PakEntry(None)
+            entry.lowercase_path_hash, entry.uppercase_path_hash = get_mmh3_hashes(gamepath)
+            entry.compression_flag = COMPRESSION_FLAGS[idx % len(COMPRESSION_FLAGS)]
+            compressed_data = compress_data(data, entry.compression_flag)
+            entry.offset = offset
+            entry.compressed_size = len(compressed_data)
+            entry.decompressed_size = len(data)
+            entry.checksum = 0
+            f.seek(0x10 + 0x30 * idx)
+            entry.write(f)
+            f.seek(offset)
+            f.write(compressed_data)
+            offset = f.tell()
+
+    with open(release_list_path, mode='w', encoding='utf-8') as f:
+        f.write('\n'.join(gamepath for gamepath, _ in files))
+
+    return {
+        "source_dir" : source_dir,
+        "pak_path" : pak_path,
+        "release_list_path" : release_list_path,
+        "entries" : len(files),
+        "bytes" : sum(len(data) for _, data in files),
+    }
+
+def bench_open(pak_path : Path) -> dict:
+    pak = REPak(pak_path)
+    return {"entries" : pak.entry_count}
+
+def bench_unpack(pak_path : Path, release_list_path : Path, output_dir : Path) -> dict:
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    pak = REPak(pak_path)
+    pak.unpack(output_dir, release_list_path)
+    return {"entries" : pak.entry_count, "bytes" : sum(entry.decompressed_size for entry in pak.entry_list)}
+
+def bench_iterate(pak_path : Path, release_list_path : Path, prefetch : int) -> dict:
+    pak = REPak(pak_path)
+    entries = 0
+    total_size = 0
+    for _, _, data in pak.iter_entries(release_list_path, prefetch=prefetch):
+        entries += 1
+        total_size += len(data)
+    return {"entries" : entries, "bytes" : total_size}
+
+def bench_scan(source_dir : Path) -> dict:
+    manifest = scan_pak_dir(source_dir)
+    return {"entries" : len(manifest)}
+
+def bench_build(source_dir : Path, pak_path : Path) -> dict:
+    build_pak_from_dir(source_dir, pak_path)
+    filesizes = [filepath.stat().st_size for filepath in source_dir.rglob('*') if filepath.is_file()]
+    return {"entries" : len(filesizes), "bytes" : sum(filesizes)}
+
+def bench_hash(release_list_path : Path) -> dict:
+    gamepaths = open(release_list_path, mode='r', encoding='utf-8').read().split('\n')
+    for gamepath in gamepaths:
+        get_mmh3_hashes(gamepath)
+    return {"entries" : len(gamepaths)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pak reading and writing on a synthetic pak.")
+    parser.add_argument("--work-dir", type=Path, default=Path("bench_pak"), help="Directory for the generated pak and outputs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tiny-count", type=int, default=5000, help="Number of tiny (16 B - 4 KiB) files")
+    parser.add_argument("--huge-count", type=int, default=3, help="Number of huge files")
+    parser.add_argument("--huge-size", type=int, default=32, help="Size of each huge file, in MiB")
+    parser.add_argument("--prefetch", type=int, default=4, help="Decompression prefetch used by the streaming stage")
+    parser.add_argument("--output", type=Path, help="Save the results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="Compare the results with a previously saved JSON file")
+    parser.add_argument("--keep-logging", action="store_true", help="Keep the INFO logging of the pak module (slow)")
+    args = parser.parse_args()
+
+    args.work_dir.mkdir(parents=True, exist_ok=True)
+    print("Generating synthetic pak...")
+    synthetic = generate_synthetic_pak(args.work_dir, args.seed, args.tiny_count, args.huge_count, args.huge_size * 1024 * 1024)
+    quiet = not args.keep_logging
+
+    results = {
+        "meta" : get_run_metadata(seed=args.seed, tiny_count=args.tiny_count, huge_count=args.huge_count, huge_size_mb=args.huge_size, prefetch=args.prefetch, entries=synthetic["entries"], bytes=synthetic["bytes"]),
+        "results" : {}
+    }
+    stages = {
+        "open" : (bench_open, synthetic["pak_path"]),
+        "unpack" : (bench_unpack, synthetic["pak_path"], synthetic["release_list_path"], args.work_dir / 'unpacked'),
+        "iterate" : (bench_iterate, synthetic["pak_path"], synthetic["release_list_path"], 0),
+        f"iterate_prefetch_{args.prefetch}" : (bench_iterate, synthetic["pak_path"], synthetic["release_list_path"], args.prefetch),
+        "scan" : (bench_scan, synthetic["source_dir"]),
+        "build" : (bench_build, synthetic["source_dir"], args.work_dir / 'rebuilt.pak'),
+        "hash" : (bench_hash, synthetic["release_list_path"]),
+    }
+    for stage, (function, *stage_args) in stages.items():
+        print(f"Running {stage}...")
+        results["results"][stage] = run_isolated(function, *stage_args, quiet=quiet)
+
+    print_results(results)
+    if args.compare is not None:
+        print(f"Compared with {args.compare}:")
+        print_comparison(results, args.compare)
+    if args.output is not None:
+        save_results(results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Texture codec benchmark.
+
+Builds deterministic synthetic images at standard sizes and runs every supported TexFormat through
+encode, swizzle, deswizzle and decode on each platform layout (stm, nsw, ps4), reporting megapixels per second.
+Each (format, size) pair runs in its own process. Its peak RSS is reported once, in a "<format>/<size>/peak_rss" row:
+it is the peak of the pair's most expensive operation, which can't be told apart from the others.
+
+Usage (from the repository root):
+    python -m benchmarks.tex_benchmark --output tex_results.json
+    python -m benchmarks.tex_benchmark --formats BC7 ASTC_8x8 --sizes 1024 --compare tex_results.json
+"""
+import sys
+import time
+import struct
+import argparse
+import numpy as np
+from pathlib import Path
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from req.AJTTools.plugins.tex.src.Tex import Tex
+from req.AJTTools.plugins.tex.src.Formats import formats, encoder_presets
+from benchmarks.common import run_isolated, get_run_metadata, save_results, print_results, print_comparison
+
+PLATFORM_IDS = {"stm" : -1, "nsw" : 1, "ps4" : 0xd}
+
+def get_format_name(format_id : int) -> str:
+    tex_format = formats[format_id]
+    name = type(tex_format).__name__
+    if name == "ASTC_UNORM":
+        return f"ASTC_{tex_format.block_width}x{tex_format.block_height}"
+    return name
+
+def get_benchmark_formats() -> dict[str, int]:
+    """
+    One format id per codec (the first id of each format name), e.g. "BC7_UNORM" or "ASTC_8x8".
+    """
+    benchmark_formats = {}
+    for format_id in formats:
+        benchmark_formats.setdefault(get_format_name(format_id), format_id)
+    return benchmark_formats
+
+def get_nsw_swizzle_mode(height : int, block_height : int) -> int:
+    # block height (in GOBs) picked like the Tegra driver: the smallest power of two covering the block rows, up to 16
+    block_rows = -(-height // block_height)
+    swizzle_mode = 0
+    while swizzle_mode < 4 and 8 * 2 ** swizzle_mode < block_rows:
+        swizzle_mode += 1
+    return swizzle_mode
+
+def generate_image(size : int, seed : int = 0) -> Image.Image:
+    """
+    Smooth gradients with a noisy band and hard-edged rectangles, so encoders see flat, detailed and sharp areas.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    rgba = np.empty((size, size, 4), dtype=np.float32)
+    rgba[..., 0] = x * 255
+    rgba[..., 1] = y * 255
+    rgba[..., 2] = (np.sin(x * 12) * np.cos(y * 9) + 1) * 127
+    rgba[..., 3] = 255 - x * y * 128
+    band = slice(size // 3, 2 * size // 3)
+    rgba[band, :, :3] += rng.normal(0, 24, (band.stop - band.start, size, 3))
+    for _ in range(16):
+        left, top = rng.integers(0, size, 2)
+        rgba[top:top + size // 8, left:left + size // 8, :3] = rng.integers(0, 256, 3)
+    return Image.fromarray(np.clip(rgba, 0, 255).astype(np.uint8), 'RGBA')
+
+def write_template(template_path : Path, format_id : int, platform : str, size : int):
+    """
+    Writes a one-mipmap .tex header (no data) that Tex can open in header-only mode.
+    """
+    block_height = formats[format_id].block_size[1]
+    nsw_swizzle_mode = get_nsw_swizzle_mode(size, block_height) if platform == "nsw" else 0
+    with open(template_path, mode='wb') as f:
+        f.write(struct.pack('<4siHHhBBiiiiii', b'TEX\x00', 143221013, size, size, 1, 1, 1 * 16, format_id, PLATFORM_IDS[platform], 0, 0, nsw_swizzle_mode, 0))
+        f.write(struct.pack('<iiii', 0x38, 0, 0, 0))
+
+def best_time(function, repeat : int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_format(format_id : int, size : int, platforms : list[str], work_dir : Path, preset : str, repeat : int) -> dict:
+    tex_format = formats[format_id]
+    image = generate_image(size)
+    rgba_data = image.tobytes()
+    pixels = size * size
+    ops = {}
+
+    try:
+        seconds, blocks = best_time(lambda: tex_format.encode(rgba_data, size, size, preset), repeat)
+        ops["encode"] = {"seconds" : seconds, "mp_per_s" : pixels / 1e6 / seconds}
+    except Exception:
+        # formats without an encoder (BC6H) are still decoded and swizzled, from random blocks
+        block_width, block_height = tex_format.block_size
+        block_count = -(-size // block_width) * -(-size // block_height)
+        blocks = np.random.default_rng(0).integers(0, 256, block_count * tex_format.bytes_per_block, dtype=np.uint8).tobytes()
+        ops["encode"] = {"unsupported" : True}
+    seconds, _ = best_time(lambda: tex_format.decode(blocks, size, size), repeat)
+    ops["decode"] = {"seconds" : seconds, "mp_per_s" : pixels / 1e6 / seconds}
+
+    for platform in platforms:
+        if platform == "stm" and isinstance(tex_format.bits_per_pixel, float):
+            continue # ASTC textures only exist on Switch, and the Steam pitch computation doesn't support them
+        template_path = work_dir / f"{get_format_name(format_id)}_{platform}_{size}.tex"
+        write_template(template_path, format_id, platform, size)
+        mipmap = Tex(template_path, header_only=True).mipmaps[0]
+        seconds, _ = best_time(lambda: mipmap.set_blocks(blocks, size, size), repeat)
+        ops[f"{platform}_swizzle"] = {"seconds" : seconds, "mp_per_s" : pixels / 1e6 / seconds}
+        seconds, deswizzled_blocks = best_time(lambda: mipmap.get_blocks(size, size), repeat)
+        ops[f"{platform}_deswizzle"] = {"seconds" : seconds, "mp_per_s" : pixels / 1e6 / seconds}
+        if deswizzled_blocks != blocks:
+            raise Exception(f"Error: {platform} swizzle round trip changed the blocks of {get_format_name(format_id)}")
+    return {"ops" : ops}
+
+def main():
+    benchmark_formats = get_benchmark_formats()
+    parser = argparse.ArgumentParser(description="Benchmark texture encoding, decoding and swizzling for every format and platform.")
+    parser.add_argument("--work-dir", type=Path, default=Path("bench_tex"), help="Directory for the generated .tex templates")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 1024], help="Square image sizes")
+    parser.add_argument("--formats", nargs="+", help=f"Only run the formats whose name contains one of these strings (available: {', '.join(benchmark_formats)})")
+    parser.add_argument("--platforms", nargs="+", default=list(PLATFORM_IDS), choices=list(PLATFORM_IDS))
+    parser.add_argument("--preset", default="medium", choices=encoder_presets, help="Encoder speed/quality preset")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each operation ; the best time is kept")
+    parser.add_argument("--output", type=Path, help="Save the results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="Compare the results with a previously saved JSON file")
+    args = parser.parse_args()
+
+    if args.formats is not None:
+        benchmark_formats = {name : format_id for name, format_id in benchmark_formats.items() if any(pattern.lower() in name.lower() for pattern in args.formats)}
+    args.work_dir.mkdir(parents=True, exist_ok=True)
+
+    results = {
+        "meta" : get_run_metadata(sizes=args.sizes, formats=list(benchmark_formats), platforms=args.platforms, preset=args.preset, repeat=args.repeat),
+        "results" : {}
+    }
+    for name, format_id in benchmark_formats.items():
+        for size in args.sizes:
+            print(f"Running {name} {size}x{size}...")
+            group = run_isolated(bench_format, format_id, size, args.platforms, args.work_dir, args.preset, args.repeat)
+            for op, metrics in group["ops"].items():
+                results["results"][f"{name}/{size}/{op}"] = metrics
+            results["results"][f"{name}/{size}/peak_rss"] = {"peak_rss_mb" : group["peak_rss_mb"]}
+
+    print_results(results)
+    if args.compare is not None:
+        print(f"Compared with {args.compare}:")
+        print_comparison(results, args.compare)
+    if args.output is not None:
+        save_results(results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QMenuBar, QMenu, QFileDialog,
     QDialog, QVBoxLayout, QLabel, QComboBox, QPushButton, QMessageBox, QTextEdit, QHBoxLayout, QWidget, QListWidget, QStackedWidget
 )
-from PyQt6.QtGui import QIcon, QAction, QClipboard, QPixmap
+from PyQt6.QtGui import QIcon, QAction, QClipboard, QPixmap, QImage
 from PyQt6.QtCore import Qt, QThread, pyqtSignal, QObject, QSize
 from pathlib import Path
 from win11toast import toast
@@ -284,45 +284,7 @@ class MultipleTexConvertDialog(QDialog):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"An error occurred during conversion: {e}")
 
-from pathlib import Path
-from req.AJTTools.plugins.tex.src.Tex import Tex
-
-class TexConverter:
-    @staticmethod
-    def PCtex_to_NSWtex(pc_tex_path: Path, switch_tex_path: Path, output_switch_tex_path: Path) -> None:
-        """
-        Конвертирует текстуру из PC формата в Nintendo Switch, используя промежуточный DDS.
-
-        :param pc_tex_path: Путь к текстуре PC.
-        :param switch_tex_path: Путь к текстуре Switch.
-        :param output_switch_tex_path: Путь для сохранения конвертированной текстуры Switch.
-        """
-        pc_tex = Tex(pc_tex_path)
-        temp_dds = pc_tex_path.with_suffix('.temp_export.dds')
-        pc_tex.export_file(str(temp_dds))
-        switch_tex = Tex(switch_tex_path)
-        switch_tex.import_file(str(temp_dds))
-        switch_tex.save(output_switch_tex_path)
-        if temp_dds.exists():
-            temp_dds.unlink()
-
-    @staticmethod
-    def NSWtex_to_PCtex(switch_tex_path: Path, pc_tex_path: Path, output_pc_tex_path: Path) -> None:
-        """
-        Конвертирует текстуру из Nintendo Switch формата в PC, используя промежуточный DDS.
-
-        :param switch_tex_path: Путь к текстуре Switch.
-        :param pc_tex_path: Путь к текстуре PC.
-        :param output_pc_tex_path: Путь для сохранения конвертированной текстуры PC.
-        """
-        switch_tex = Tex(switch_tex_path)
-        temp_dds = switch_tex_path.with_suffix('.temp_export.dds')
-        switch_tex.export_file(str(temp_dds))
-        pc_tex = Tex(pc_tex_path)
-        pc_tex.import_file(str(temp_dds))
-        pc_tex.save(output_pc_tex_path)
-        if temp_dds.exists():
-            temp_dds.unlink()
+from req.AJTTools.plugins.tex.src.TexConverter import TexConverter
 
 
 class MainWindow(QMainWindow):
@@ -437,6 +399,8 @@ class MainWindow(QMainWindow):
 
         self.image_label = QLabel(self)
         self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        # exported images are previewed from their .tex file, as Qt can't read every format they are written in (e.g. BC7 DDS)
+        self.exported_tex_sources = {}
         self.stacked_widget.addWidget(self.image_label)
 
         button_layout = QHBoxLayout()
@@ -494,6 +458,15 @@ class MainWindow(QMainWindow):
             )
             self.image_label.setPixmap(scaled_pixmap)
 
+    def load_tex_thumbnail(self, file_path):
+        # only the smallest mipmap that covers the label is decoded
+        from req.AJTTools.plugins.tex import Tex
+        label_size = self.image_label.size() * 0.9
+        thumbnail = Tex(file_path).get_thumbnail((max(256, label_size.width()), max(256, label_size.height())))
+        data = thumbnail.tobytes()
+        image = QImage(data, thumbnail.width, thumbnail.height, thumbnail.width * 4, QImage.Format.Format_RGBA8888)
+        return QPixmap.fromImage(image)
+
     def show_error_message(self, message):
         logging.error(f"Error message: {message}")
         QMessageBox.critical(self, "Error", message)
@@ -898,12 +871,14 @@ class MainWindow(QMainWindow):
                     self.worker_thread.start()
 
     def _convert_tex_to_image_worker(self, file_names, selected_format, output_dir):
-        from req.AJTTools.plugins.tex import Tex
+        from req.AJTTools.plugins.tex import Tex, TexCache
+        cache = TexCache(Path("cache") / "tex")
         results = []
         for file_name in file_names:
-            tex = Tex(file_name)
+            tex = Tex(file_name, cache=cache)
             output_file = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(file_name))[0]}.{selected_format}")
             tex.export_file(output_file)
+            self.exported_tex_sources[output_file] = file_name
             results.append(output_file)
         return results
 
@@ -915,7 +890,15 @@ class MainWindow(QMainWindow):
                 self.display_multiple_files(result)
 
     def display_single_file(self, file_path):
-        if file_path.endswith('.png') or file_path.endswith('.dds'):
+        if file_path in self.exported_tex_sources:
+            self.image_label.setPixmap(self.load_tex_thumbnail(self.exported_tex_sources[file_path]))
+            self.scale_image_to_label()
+            self.stacked_widget.setCurrentWidget(self.image_label)
+        elif '.tex.' in os.path.basename(file_path):
+            self.image_label.setPixmap(self.load_tex_thumbnail(file_path))
+            self.scale_image_to_label()
+            self.stacked_widget.setCurrentWidget(self.image_label)
+        elif file_path.endswith('.png') or file_path.endswith('.dds'):
             pixmap = QPixmap(file_path)
             self.image_label.setPixmap(pixmap)
             self.scale_image_to_label()
@@ -938,7 +921,15 @@ class MainWindow(QMainWindow):
 
     def display_file_content(self, item):
         file_path = item.text()
-        if file_path.endswith('.png'):
+        if file_path in self.exported_tex_sources:
+            self.image_label.setPixmap(self.load_tex_thumbnail(self.exported_tex_sources[file_path]))
+            self.scale_image_to_label()
+            self.stacked_widget.setCurrentWidget(self.image_label)
+        elif '.tex.' in os.path.basename(file_path):
+            self.image_label.setPixmap(self.load_tex_thumbnail(file_path))
+            self.scale_image_to_label()
+            self.stacked_widget.setCurrentWidget(self.image_label)
+        elif file_path.endswith('.png'):
             pixmap = QPixmap(file_path)
             self.image_label.setPixmap(pixmap)
             self.scale_image_to_label()
@@ -956,6 +947,7 @@ class MainWindow(QMainWindow):
             output_dir = QFileDialog.getExistingDirectory(self, "Select Output Directory")
             if output_dir:
                 self.worker_thread = WorkerThread(self._convert_image_to_tex_worker, file_names, output_dir)
+                self.worker_thread.signals.result.connect(self.handle_convert_tex_result)
                 self.worker_thread.signals.finished.connect(self.handle_convert_finished)
                 self.worker_thread.signals.error.connect(self.handle_convert_error)
                 self.worker_thread.start()
@@ -967,7 +959,7 @@ class MainWindow(QMainWindow):
             base_name = os.path.basename(file_name)
             tex_name = base_name.replace('.png', '.tex.35').replace('.dds', '.tex.35')
             output_file = os.path.join(output_dir, tex_name)
-            tex = Tex(output_file)
+            tex = Tex(output_file, header_only=True)
             tex.import_file(file_name)
             tex.save(output_file)
             results.append(output_file)
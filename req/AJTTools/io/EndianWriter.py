@@ -1,10 +1,13 @@
 import struct
+from ..utils import break_hardlink
 
 class LittleEndianBinaryFileWriter:
     def __init__(self,filepath : str):
         self.filepath = filepath
 
     def __enter__(self):
+        # files of a deduplicated pak extraction may be hardlinked together
+        break_hardlink(self.filepath)
         self.file = open(self.filepath,mode='wb')
         self.write = self.file.write
         self.tell = self.file.tell
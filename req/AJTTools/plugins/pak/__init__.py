@@ -1 +1 @@
-from .src import REPak, build_pak_from_dir
\ No newline at end of file
+from .src import REPak, PakDiff, build_pak_from_dir, load_release_list
\ No newline at end of file
@@ -1,11 +1,17 @@
+import os
 import mmh3
+import hashlib
 import zlib
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
 from pathlib import Path
 from datetime import datetime
 from .PakEntry import PakEntry
 from .checksum import calculate_checksum
 from ....io import LittleEndianBinaryFileReader, LittleEndianBinaryFileWriter
+from ....utils import try_create_dir, link_or_copy, break_hardlink
 import inspect
 
 # Настройка логирования
@@ -47,15 +53,21 @@ class REPak:
             logging.error(f"Error initializing REPak: {e}")
             raise
 
-    def unpack(self, root_output_dir: Path, release_list_path: Path):
+    def unpack(self, root_output_dir: Path, release_list_path: Path, dedup: bool = False):
+        """
+        Extracts every entry to root_output_dir.
+        With dedup, byte-identical entries (same offset, or same decompressed content) are written once and the other
+        paths are hardlinked to that file (reflink or copy when hardlinks aren't possible).
+        Hardlinked files share their data: editing one of them in place changes all of them. Extracting again over
+        such a tree (with or without dedup) replaces the linked files instead of writing through them.
+        """
         logging.info(f"Executing: {inspect.currentframe().f_lineno}")
         logging.info(f"Unpacking REPak to directory: {root_output_dir}")
         try:
-            filepaths = open(release_list_path, mode='r', encoding='utf-8').read().split('\n')
-            filehashes = {}
-            for filepath in filepaths:
-                lowercase_hash, _ = get_mmh3_hashes(filepath)
-                filehashes[lowercase_hash] = filepath.lower()
+            filehashes = load_release_list(release_list_path)
+            if dedup:
+                self.unpack_dedup(root_output_dir, filehashes)
+                return
             with open(self.filepath, mode='rb') as f:
                 total_files = len(self.entry_list)
                 for idx, entry in enumerate(self.entry_list):
@@ -66,27 +78,141 @@ class REPak:
             logging.error(f"Error unpacking REPak: {e}")
             raise
 
-def build_pak_from_dir(dir_path: Path, pak_path: Path):
+    def unpack_dedup(self, root_output_dir: Path, filehashes: dict):
+        logging.info(f"Executing: {inspect.currentframe().f_lineno}")
+        written_by_offset = {}
+        written_by_digest = {}
+        link_counts = {"hardlink" : 0, "reflink" : 0, "copy" : 0}
+        with open(self.filepath, mode='rb') as f:
+            for entry in sorted(self.entry_list, key=lambda entry: entry.offset):
+                filepath = os.path.join(root_output_dir, entry.get_path(filehashes))
+                offset_key = (entry.offset, entry.compressed_size)
+                if offset_key in written_by_offset:
+                    link_counts[link_or_copy(written_by_offset[offset_key], filepath)] += 1
+                    continue
+
+                data = entry.read(f)
+                digest_key = (len(data), hashlib.blake2b(data, digest_size=32).digest())
+                if digest_key in written_by_digest:
+                    link_counts[link_or_copy(written_by_digest[digest_key], filepath)] += 1
+                else:
+                    logging.info(f"Unpacking {filepath}... (compression:{entry.get_compression_name()})")
+                    try_create_dir(filepath)
+                    break_hardlink(filepath)
+                    with open(filepath, mode='wb') as file:
+                        file.write(data)
+                    written_by_digest[digest_key] = filepath
+                written_by_offset[offset_key] = written_by_digest[digest_key]
+
+        logging.info(f"Unpacking completed: {len(written_by_digest)} unique files written for {len(self.entry_list)} entries ({link_counts['hardlink']} hardlinks, {link_counts['reflink']} reflinks, {link_counts['copy']} copies)")
+
+    def iter_entries(self, release_list_path: Path = None, entry_filter: Callable[[str | int, PakEntry], bool] = None, prefetch: int = 0) -> Iterator[tuple[str | int, PakEntry, bytes]]:
+        """
+        Yields (path_or_hash, entry, data) for every entry of the pak, in ascending offset order so the file is read sequentially.
+        path_or_hash is the game path when it is known from the release list, else the lowercase path hash.
+        entry_filter(path_or_hash, entry) is called before any data is read; entries it rejects are skipped.
+        With prefetch > 0, up to that many entries are read ahead and decompressed in a thread pool.
+        """
+        logging.info(f"Executing: {inspect.currentframe().f_lineno}")
+        logging.info(f"Iterating over REPak entries: {self.filepath}")
+        filehashes = load_release_list(release_list_path) if release_list_path is not None else {}
+        selected_entries = []
+        for entry in sorted(self.entry_list, key=lambda entry: entry.offset):
+            path_or_hash = filehashes.get(entry.lowercase_path_hash, entry.lowercase_path_hash)
+            if entry_filter is None or entry_filter(path_or_hash, entry):
+                selected_entries.append((path_or_hash, entry))
+
+        with open(self.filepath, mode='rb') as f:
+            if prefetch <= 0:
+                for path_or_hash, entry in selected_entries:
+                    yield path_or_hash, entry, entry.read(f)
+                return
+
+            with ThreadPoolExecutor(max_workers=prefetch) as executor:
+                pending = deque()
+                for path_or_hash, entry in selected_entries:
+                    # zlib and zstd release the GIL, so decompression overlaps with the sequential reads
+                    pending.append((path_or_hash, entry, executor.submit(entry.decompress, entry.read_compressed(f))))
+                    if len(pending) > prefetch:
+                        path_or_hash, entry, future = pending.popleft()
+                        yield path_or_hash, entry, future.result()
+                while pending:
+                    path_or_hash, entry, future = pending.popleft()
+                    yield path_or_hash, entry, future.result()
+
+def load_release_list(release_list_path: Path) -> dict[int, str]:
+    logging.info(f"Executing: {inspect.currentframe().f_lineno}")
+    logging.info(f"Loading release list: {release_list_path}")
+    filepaths = open(release_list_path, mode='r', encoding='utf-8').read().split('\n')
+    filehashes = {}
+    for filepath, (lowercase_hash, _) in zip(filepaths, get_mmh3_hashes_batch(filepaths)):
+        filehashes[lowercase_hash] = filepath.lower()
+    return filehashes
+
+def scan_pak_dir(dir_path: Path) -> list[tuple[str, int, int, int]]:
+    """
+    Lists the files to pack as (filepath, lowercase_hash, uppercase_hash, size) tuples, largest files first.
+    The tree is walked with os.scandir so the directory listing provides the file type (and on Windows the size) without extra stat calls.
+    """
+    logging.info(f"Executing: {inspect.currentframe().f_lineno}")
+    logging.info(f"Scanning directory: {dir_path}")
+    manifest = []
+    unknown_files_path = os.path.join(dir_path, 'unknown')
+    if os.path.isdir(unknown_files_path):
+        with os.scandir(unknown_files_path) as it:
+            for entry in it:
+                if not entry.is_dir():
+                    lowercase_path_hash, uppercase_path_hash = os.path.splitext(entry.name)[0].split('-')
+                    manifest.append((entry.path, int(lowercase_path_hash), int(uppercase_path_hash), entry.stat().st_size))
+
+    named_files = []
+    named_files_root = os.path.join(dir_path, 'natives')
+    stack = [(named_files_root, 'natives/')]
+    while stack and os.path.isdir(named_files_root):
+        current_dir, current_gamepath = stack.pop()
+        with os.scandir(current_dir) as it:
+            for entry in it:
+                if entry.is_dir():
+                    stack.append((entry.path, current_gamepath + entry.name + '/'))
+                else:
+                    named_files.append((entry.path, current_gamepath + entry.name, entry.stat().st_size))
+
+    hashes = get_mmh3_hashes_batch([gamepath for _, gamepath, _ in named_files])
+    for (filepath, _, size), (lowercase_hash, uppercase_hash) in zip(named_files, hashes):
+        manifest.append((filepath, lowercase_hash, uppercase_hash, size))
+
+    manifest.sort(key=lambda file_info: file_info[3], reverse=True)
+    logging.info(f"Found {len(manifest)} files to pack")
+    return manifest
+
+def compress_pak_file(filepath: str) -> tuple[int, bytes, int, str]:
+    data = open(filepath, 'rb').read()
+
+    compression_name = "none"
+    if len(data) >= 8:
+        magic1 = int.from_bytes(data[0:4], 'little')
+        magic2 = int.from_bytes(data[4:8], 'little')
+        if not (magic1 in [0x75B22630, 0x564D4552, 0x44484B42, 0x4B504B41] or magic2 in [0x70797466]):
+            compression_name = "deflate"
+
+    if compression_name == "none":
+        compressed_data = data
+        compression_flag = 0
+
+    elif compression_name == "deflate":
+        compressed_data = zlib.compress(data, wbits=-15)
+        compression_flag = 1
+
+    return len(data), compressed_data, compression_flag, compression_name
+
+def build_pak_from_dir(dir_path: Path, pak_path: Path, workers: int = None):
     logging.info(f"Executing: {inspect.currentframe().f_lineno}")
     logging.info(f"Building PAK from directory: {dir_path} to file: {pak_path}")
-    files_info = []
     try:
-        unknown_files_path = dir_path / 'unknown'
-        if unknown_files_path.is_dir():
-            for file in unknown_files_path.iterdir():
-                if not file.is_dir():
-                    lowercase_path_hash, uppercase_path_hash = file.stem.split('-')
-                    files_info.append((file, int(lowercase_path_hash), int(uppercase_path_hash)))
-        named_files_root = dir_path / 'natives'
-        if named_files_root.is_dir():
-            for filepath in named_files_root.rglob('*'):
-                if not filepath.is_dir():
-                    gamepath = str(Path('natives') / filepath.relative_to(named_files_root)).replace('\\', '/')
-                    lowercase_hash, uppercase_hash = get_mmh3_hashes(gamepath)
-                    files_info.append((filepath, lowercase_hash, uppercase_hash))
-
-        total_files = len(files_info)
-        with LittleEndianBinaryFileWriter(pak_path) as f:
+        files_info = scan_pak_dir(dir_path)
+        workers = workers or os.cpu_count() or 1
+
+        with LittleEndianBinaryFileWriter(pak_path) as f, ThreadPoolExecutor(max_workers=workers) as executor:
             f.write(b'KPKA')
             f.writeint32(4)
             entry_count = len(files_info)
@@ -94,27 +220,25 @@ def build_pak_from_dir(dir_path: Path, pak_path: Path):
             f.write(b'FLAG')
             f.write(b'\x00' * (0x30 * entry_count))
             offset = 0x10 + 0x30 * entry_count
-            for idx, file_info in enumerate(files_info):
-                filepath, lowercase_path_hash, uppercase_path_hash = file_info
-                data = open(filepath, 'rb').read()
-
-                compression_name = "none"
-                if len(data) >= 8:
-                    magic1 = int.from_bytes(data[0:4], 'little')
-                    magic2 = int.from_bytes(data[4:8], 'little')
-                    if not (magic1 in [0x75B22630, 0x564D4552, 0x44484B42, 0x4B504B41] or magic2 in [0x70797466]):
-                        compression_name = "deflate"
 
-                if compression_name == "none":
-                    compressed_data = data
-                    compression_flag = 0
+            # files_info is sorted by size, so the biggest files start compressing first and no worker is left with a late straggler;
+            # the results are written in submission order with a bounded number of files in flight.
+            pending = deque()
+            file_iter = iter(enumerate(files_info))
+            for idx, file_info in file_iter:
+                pending.append((idx, file_info, executor.submit(compress_pak_file, file_info[0])))
+                if len(pending) >= 2 * workers:
+                    break
 
-                elif compression_name == "deflate":
-                    compressed_data = zlib.compress(data, wbits=-15)
-                    compression_flag = 1
+            while pending:
+                idx, file_info, future = pending.popleft()
+                next_file = next(file_iter, None)
+                if next_file is not None:
+                    pending.append((*next_file, executor.submit(compress_pak_file, next_file[1][0])))
 
+                filepath, lowercase_path_hash, uppercase_path_hash, _ = file_info
+                decompressed_size, compressed_data, compression_flag, compression_name = future.result()
                 logging.info(f"Adding {filepath} to the pak file (compression:{compression_name})")
-                decompressed_size = len(data)
                 compressed_size = len(compressed_data)
                 checksum = 0
                 f.seek(0x10 + 0x30 * idx)
@@ -145,3 +269,16 @@ def get_mmh3_hashes(filepath: str):
     except Exception as e:
         logging.error(f"Error calculating mmh3 hashes: {e}")
         raise
+
+def get_mmh3_hashes_batch(filepaths: list[str]) -> list[tuple[int, int]]:
+    """
+    Same as get_mmh3_hashes for a whole list of paths, without the per-path logging.
+    """
+    logging.info(f"Executing: {inspect.currentframe().f_lineno}")
+    logging.info(f"Calculating mmh3 hashes for {len(filepaths)} filepaths")
+    hash_function = mmh3.hash
+    return [
+        (hash_function(filepath.lower().encode("utf-16-le"), seed=0xffffffff, signed=False),
+         hash_function(filepath.upper().encode("utf-16-le"), seed=0xffffffff, signed=False))
+        for filepath in filepaths
+    ]
@@ -0,0 +1,97 @@
+from pathlib import Path
+import logging
+import inspect
+
+from .Pak import REPak, load_release_list
+from .PakEntry import PakEntry
+
+COMPARE_CHUNK_SIZE = 1024 * 1024
+
+def _as_pak_list(paks) -> list[REPak]:
+    if isinstance(paks, (REPak, str, Path)):
+        paks = [paks]
+    return [pak if isinstance(pak, REPak) else REPak(Path(pak)) for pak in paks]
+
+def _build_toc(paks: list[REPak]) -> dict[tuple[int, int], tuple[REPak, PakEntry]]:
+    # paks are given in load order, so an entry of a later (patch) pak replaces the one of an earlier pak
+    toc = {}
+    for pak in paks:
+        for entry in pak.entry_list:
+            toc[(entry.lowercase_path_hash, entry.uppercase_path_hash)] = (pak, entry)
+    return toc
+
+def _same_raw_data(old_file, old_entry: PakEntry, new_file, new_entry: PakEntry) -> bool:
+    old_file.seek(old_entry.offset)
+    new_file.seek(new_entry.offset)
+    remaining = old_entry.compressed_size
+    while remaining > 0:
+        size = min(COMPARE_CHUNK_SIZE, remaining)
+        if old_file.read(size) != new_file.read(size):
+            return False
+        remaining -= size
+    return True
+
+class PakDiff:
+    """
+    Change report between two paks (or two sets of paks, given in load order).
+    Entries are matched by path hash and compared by sizes and checksums first; payloads are only read
+    for the entries that metadata alone can't settle, with raw data compared before decompressing.
+    """
+    def __init__(self, old_paks, new_paks, release_list_path: Path = None):
+        logging.info(f"Executing: {inspect.currentframe().f_lineno}")
+        logging.info(f"Comparing paks {old_paks} and {new_paks}")
+        self.hashmap = load_release_list(release_list_path) if release_list_path is not None else {}
+        old_toc = _build_toc(_as_pak_list(old_paks))
+        new_toc = _build_toc(_as_pak_list(new_paks))
+
+        self.added = sorted(new_toc[key][1].get_path(self.hashmap) for key in new_toc.keys() - old_toc.keys())
+        self.removed = sorted(old_toc[key][1].get_path(self.hashmap) for key in old_toc.keys() - new_toc.keys())
+        self.modified = []
+        self.content_compared_count = 0
+
+        to_compare = []
+        for key in old_toc.keys() & new_toc.keys():
+            old_pak, old_entry = old_toc[key]
+            new_pak, new_entry = new_toc[key]
+            if old_entry.decompressed_size != new_entry.decompressed_size:
+                self.modified.append(new_entry.get_path(self.hashmap))
+            elif old_entry.checksum != 0 and new_entry.checksum != 0:
+                if old_entry.checksum != new_entry.checksum:
+                    self.modified.append(new_entry.get_path(self.hashmap))
+            else:
+                to_compare.append((old_pak, old_entry, new_pak, new_entry))
+
+        # reading in old offset order keeps at least one of the two files sequential ; REPak.filepath may be a str or a Path
+        to_compare.sort(key=lambda item: (str(item[0].filepath), item[1].offset))
+        opened_files = {}
+        try:
+            for old_pak, old_entry, new_pak, new_entry in to_compare:
+                for pak in [old_pak, new_pak]:
+                    if pak.filepath not in opened_files:
+                        opened_files[pak.filepath] = open(pak.filepath, mode='rb')
+                old_file = opened_files[old_pak.filepath]
+                new_file = opened_files[new_pak.filepath]
+                self.content_compared_count += 1
+
+                if old_entry.compression_flag == new_entry.compression_flag and old_entry.compressed_size == new_entry.compressed_size:
+                    if _same_raw_data(old_file, old_entry, new_file, new_entry):
+                        continue
+                    if old_entry.compression_flag == 0:
+                        self.modified.append(new_entry.get_path(self.hashmap))
+                        continue
+                if old_entry.read(old_file) != new_entry.read(new_file):
+                    self.modified.append(new_entry.get_path(self.hashmap))
+        finally:
+            for file in opened_files.values():
+                file.close()
+
+        self.modified.sort()
+        logging.info(f"{len(self.added)} added, {len(self.removed)} removed, {len(self.modified)} modified ({self.content_compared_count} entries needed a content comparison)")
+
+    def write_report(self, report_path: Path):
+        with open(report_path, mode='w', encoding='utf-8') as f:
+            for title, paths in [("Added", self.added), ("Removed", self.removed), ("Modified", self.modified)]:
+                f.write(f"{title} ({len(paths)}):\n")
+                for path in paths:
+                    f.write(f"{path}\n")
+                f.write("\n")
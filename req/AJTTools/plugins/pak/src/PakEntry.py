@@ -1,5 +1,5 @@
 from ....io import LittleEndianBinaryFileReader, LittleEndianBinaryFileWriter
-from ....utils import try_create_dir
+from ....utils import try_create_dir, break_hardlink
 
 from pathlib import Path
 import zlib
@@ -20,30 +20,45 @@ class PakEntry:
             self.compression_flag = f.readint64()
             self.checksum = f.readint64()
 
-    def export(self, f: LittleEndianBinaryFileReader, root_output_dir: str, hashmap: dict):
-        logging.info(f"Executing: {inspect.currentframe().f_lineno}")
-        logging.info(f"Exporting PakEntry")
+    def get_path(self, hashmap: dict) -> str:
         if self.lowercase_path_hash in hashmap:
-            output_path = hashmap[self.lowercase_path_hash]
-        else:
-            output_path = os.path.join('unknown', f'{self.lowercase_path_hash}-{self.uppercase_path_hash}.bin')
+            return hashmap[self.lowercase_path_hash]
+        return os.path.join('unknown', f'{self.lowercase_path_hash}-{self.uppercase_path_hash}.bin')
+
+    def get_compression_name(self) -> str:
+        if self.compression_flag & 1:
+            return 'deflate'
+        elif self.compression_flag & 2:
+            return 'zstd'
+        return 'none'
 
+    def read_compressed(self, f: LittleEndianBinaryFileReader) -> bytes:
         f.seek(self.offset)
-        compressed_data = f.read(self.compressed_size)
+        return f.read(self.compressed_size)
+
+    def decompress(self, compressed_data: bytes) -> bytes:
         if self.compression_flag & 1:  # deflate
             data = zlib.decompress(compressed_data, -15)
-            compression = 'deflate'
         elif self.compression_flag & 2:
             data = zstd.decompress(compressed_data)
-            compression = 'zstd'
         else:
             data = compressed_data
-            compression = 'none'
 
         assert len(data) == self.decompressed_size, "Decompression error: decompressed data size doesn't match the expected value"
-        logging.info(f"Unpacking {str(output_path)}... (compression:{compression})")
+        return data
+
+    def read(self, f: LittleEndianBinaryFileReader) -> bytes:
+        return self.decompress(self.read_compressed(f))
+
+    def export(self, f: LittleEndianBinaryFileReader, root_output_dir: str, hashmap: dict):
+        logging.info(f"Executing: {inspect.currentframe().f_lineno}")
+        logging.info(f"Exporting PakEntry")
+        output_path = self.get_path(hashmap)
+        data = self.read(f)
+        logging.info(f"Unpacking {str(output_path)}... (compression:{self.get_compression_name()})")
         filepath = os.path.join(root_output_dir, output_path)
         try_create_dir(filepath)
+        break_hardlink(filepath)
         with open(filepath, mode='wb') as file:
             file.write(data)
 
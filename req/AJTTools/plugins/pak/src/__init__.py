@@ -1 +1,2 @@
-from .Pak import REPak, build_pak_from_dir
\ No newline at end of file
+from .Pak import REPak, build_pak_from_dir, load_release_list
+from .PakDiff import PakDiff
\ No newline at end of file
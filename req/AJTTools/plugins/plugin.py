@@ -2,8 +2,20 @@ from pathlib import Path
 import traceback
 import shutil
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 from ..utils import should_export, try_create_dir
 
+def run_job(function, *args) -> str:
+    """
+    Process pool entry point: returns None on success, or the formatted traceback of the error.
+    """
+    try:
+        function(*args)
+    except Exception:
+        return traceback.format_exc()
+    return None
+
 class Plugin:
     def __init__(self, name: str, fileext : str, extract_dir_name : str):
         self.name = name
@@ -16,29 +28,25 @@ class Plugin:
     def import_file(self, input_filepath : Path, file_to_import : Path):
         raise Exception("Unimplemented import function")
 
-    def batch_export_file(self, root_dir : Path, output_dir : Path, langext : str):
-        log = ""
-        success = 0
-        failure = 0
-        try_create_dir(output_dir)
-        for abs_path in root_dir.rglob("*"):
-            if should_export(abs_path, self.fileext, langext):
-                print(f"Exporting {abs_path}...")
-                try:
-                    export_path = output_dir / abs_path.relative_to(root_dir)
-                    self.export_file(abs_path, export_path)
-                    success += 1
-
-                except KeyboardInterrupt:
-                    raise KeyboardInterrupt("")
-                
-                except:
-                    print(f"An error occured while trying to export {abs_path}")
-                    log += f"Error for file {abs_path}\n\n"
-                    log += traceback.format_exc()
-                    log += ('-' * 140) + '\n\n'
-                    failure += 1
+    def get_export_jobs(self, root_dir : Path, output_dir : Path, langext : str) -> list[tuple[Path, Path]]:
+        return [(abs_path, output_dir / abs_path.relative_to(root_dir)) for abs_path in root_dir.rglob("*") if should_export(abs_path, self.fileext, langext)]
+
+    def get_import_jobs(self, root_dir : Path, mod_dir : Path, files_dir : Path) -> list[tuple[Path, Path, Path]]:
+        jobs = []
+        for abs_path in files_dir.rglob("*"):
+            if not abs_path.is_dir():
+                root_dir_filepath = root_dir / abs_path.with_suffix('').relative_to(self.extract_dir_name)
+                mod_dir_filepath = mod_dir / abs_path.with_suffix('').relative_to(self.extract_dir_name)
+                jobs.append((abs_path, root_dir_filepath, mod_dir_filepath))
+        return jobs
 
+    def import_mod_file(self, root_dir_filepath : Path, mod_dir_filepath : Path, file_to_import : Path):
+        if not mod_dir_filepath.exists():
+            try_create_dir(mod_dir_filepath)
+            shutil.copy(root_dir_filepath, mod_dir_filepath)
+        self.import_file(mod_dir_filepath, file_to_import)
+
+    def batch_result(self, log : str, success : int, failure : int) -> str:
         if log != "":
             with open('log.txt', mode='a',encoding='utf-8') as f:
                 f.write(log)
@@ -48,41 +56,86 @@ class Plugin:
             output_mes += 'See the log.txt file for details about the errors.\n'
         return output_mes
 
-    def batch_import_file(self, root_dir : Path, mod_dir : Path, files_dir : Path):
+    def batch_export_file(self, root_dir : Path, output_dir : Path, langext : str):
         log = ""
         success = 0
         failure = 0
-        for abs_path in files_dir.rglob("*"):
-            if not abs_path.is_dir():
-                print(f"Importing {abs_path}...")
-                root_dir_filepath = root_dir / abs_path.with_suffix('').relative_to(self.extract_dir_name)
-                mod_dir_filepath = mod_dir / abs_path.with_suffix('').relative_to(self.extract_dir_name)
-                try:
-                    if not mod_dir_filepath.exists():
-                        try_create_dir(mod_dir_filepath)
-                        shutil.copy(root_dir_filepath, mod_dir_filepath)
-
-                    self.import_file(mod_dir_filepath,abs_path)
-                    success += 1
-
-                except KeyboardInterrupt:
-                    raise KeyboardInterrupt("")
-                
-                except:
-                    print(f"An error occured while trying to import {abs_path}")
-                    log += f"Error for file {abs_path}\n\n"
-                    log += traceback.format_exc()
-                    log += ('-' * 20) + '\n\n'
-                    failure += 1
+        try_create_dir(output_dir)
+        for abs_path, export_path in self.get_export_jobs(root_dir, output_dir, langext):
+            print(f"Exporting {abs_path}...")
+            try:
+                self.export_file(abs_path, export_path)
+                success += 1
 
-        if log != "":
-            with open('log.txt', mode='a',encoding='utf-8') as f:
-                f.write(log)
+            except KeyboardInterrupt:
+                raise KeyboardInterrupt("")
 
-        output_mes = f"{self.name}: {success + failure} files treated, with {success} successes and {failure} errors.\n"
-        if failure != 0:
-            output_mes += 'See the log.txt file for details about the errors.\n'
-        return output_mes
+            except:
+                print(f"An error occured while trying to export {abs_path}")
+                log += f"Error for file {abs_path}\n\n"
+                log += traceback.format_exc()
+                log += ('-' * 140) + '\n\n'
+                failure += 1
 
+        return self.batch_result(log, success, failure)
 
+    def batch_import_file(self, root_dir : Path, mod_dir : Path, files_dir : Path):
+        log = ""
+        success = 0
+        failure = 0
+        for abs_path, root_dir_filepath, mod_dir_filepath in self.get_import_jobs(root_dir, mod_dir, files_dir):
+            print(f"Importing {abs_path}...")
+            try:
+                self.import_mod_file(root_dir_filepath, mod_dir_filepath, abs_path)
+                success += 1
+
+            except KeyboardInterrupt:
+                raise KeyboardInterrupt("")
+
+            except:
+                print(f"An error occured while trying to import {abs_path}")
+                log += f"Error for file {abs_path}\n\n"
+                log += traceback.format_exc()
+                log += ('-' * 20) + '\n\n'
+                failure += 1
+
+        return self.batch_result(log, success, failure)
+
+    def run_parallel_jobs(self, function, jobs : list[tuple], action : str, separator : str, workers : int = None) -> str:
+        """
+        Runs function(*job[1:]) for every job in a process pool (job[0] being the file shown in the messages),
+        and aggregates successes, failures and tracebacks like the serial batch loops do.
+        """
+        log = ""
+        success = 0
+        failure = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            try:
+                futures = {executor.submit(run_job, function, *job[1:]) : job[0] for job in jobs}
+                for future in as_completed(futures):
+                    abs_path = futures[future]
+                    error = future.result()
+                    if error is None:
+                        print(f"{action.capitalize()}ed {abs_path}")
+                        success += 1
+                    else:
+                        print(f"An error occured while trying to {action} {abs_path}")
+                        log += f"Error for file {abs_path}\n\n"
+                        log += error
+                        log += separator + '\n\n'
+                        failure += 1
+
+            except KeyboardInterrupt:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise KeyboardInterrupt("")
+
+        return self.batch_result(log, success, failure)
+
+    def parallel_batch_export_file(self, root_dir : Path, output_dir : Path, langext : str, workers : int = None):
+        try_create_dir(output_dir)
+        jobs = [(abs_path, abs_path, export_path) for abs_path, export_path in self.get_export_jobs(root_dir, output_dir, langext)]
+        return self.run_parallel_jobs(self.export_file, jobs, "export", '-' * 140, workers)
 
+    def parallel_batch_import_file(self, root_dir : Path, mod_dir : Path, files_dir : Path, workers : int = None):
+        jobs = [(abs_path, root_dir_filepath, mod_dir_filepath, abs_path) for abs_path, root_dir_filepath, mod_dir_filepath in self.get_import_jobs(root_dir, mod_dir, files_dir)]
+        return self.run_parallel_jobs(self.import_mod_file, jobs, "import", '-' * 20, workers)
@@ -1,20 +1,189 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import traceback
+import shutil
 
-from .src import Tex, TexConverter
+from .src import Tex, TexConverter, TexCache, TexEncodeCache, TexCatalog, ContentIndex, encoder_presets
+from .src.RawImage import is_sidecar
+from .src.ContentIndex import get_file_hashes
+from .src.TexCache import get_file_hash
+from .src.TexCatalog import read_tex_info
 from ..plugin import Plugin
 from ...utils import try_create_dir
 
+export_formats = { # export_format: (file extension, PNG zlib level)
+    "png" : ("png", None),
+    "png_fast" : ("png", 1),
+    "png_store" : ("png", 0),
+    "tiff" : ("tiff", None),
+    "rgba" : ("rgba", None),
+    "dds" : ("dds", None),
+}
+
+def get_import_key(file_to_import : Path, tex_filepath : Path) -> tuple[str, tuple]:
+    """
+    Returns the hash of the imported file's bytes (identical files are grouped without being decoded), and what
+    the encoded blocks depend on in the target texture: its kind of blocks and mipmap count.
+    Files and textures that can't be read get unique keys, and fail on their own import.
+    """
+    try:
+        file_hash = get_file_hash(file_to_import)
+    except Exception:
+        return str(file_to_import), None
+    try:
+        info = read_tex_info(tex_filepath)
+    except Exception:
+        return file_hash, str(tex_filepath)
+    return file_hash, (info["format_name"], info["block_width"], info["block_height"], info["mipmap_count"])
+
+def get_perceptual_hash(file_to_import : Path) -> int:
+    try:
+        return get_file_hashes(file_to_import, True)[1]
+    except Exception:
+        return None
+
 class TexPlugin(Plugin):
     help = "Texture (.tex) files"
-    def __init__(self):
+    def __init__(self, workers : int = 1, cache_dir : Path = None, cache_size : int = 1024 * 1024 * 1024, encoder_preset : str = "medium", export_format : str = "png",
+                 encode_cache_dir : Path = None, encode_cache_size : int = 4 * 1024 * 1024 * 1024, strip_workers : int = 1,
+                 dedup : bool = False, similar_distance : int = None):
+        """
+        workers: size of the process pool used by the batch functions (1: serial, the default ; None: one per CPU).
+        Parallel batches are opt-in, e.g. TexPlugin(workers=None) for a command line run.
+        cache_dir: directory of a TexCache of decoded textures shared by the exports (None: no cache).
+        encoder_preset: speed/quality preset of the BC7 and ASTC encoders, from "fastest" to "exhaustive".
+        export_format: "png" for decoded images, "png_fast" or "png_store" for PNG files with little or no zlib compression,
+        "tiff" for uncompressed TIFF files, "rgba" for raw RGBA pixels with a JSON sidecar, or "dds" for the raw blocks of every mipmap.
+        The faster formats are meant for machine pipelines ; imports accept all of them.
+        encode_cache_dir: directory of a TexEncodeCache of encoded mipmaps shared by the imports (None: no cache).
+        strip_workers: workers encoding the block-row strips of each large mipmap (None: one per CPU, 1: one encoder call) ;
+        for imports dominated by a few large textures, as the batch functions already encode one texture per process.
+        dedup: opt-in ; parallel batch imports (workers other than 1) encode each imported file once per kind of blocks and mipmap count,
+        and copy the blocks into every other texture importing an identical file (e.g. language and platform copies) ;
+        the dedup ratio is reported.
+        similar_distance: if set, deduplicated batch imports also decode the imported files to report the ones whose perceptual
+        hashes are at most that many bits apart without being identical, as they might be meant to be the same image.
+        """
         super().__init__("TexPlugin", ".tex", "tex")
+        self.workers = workers
+        self.cache = TexCache(cache_dir, cache_size) if cache_dir is not None else None
+        if encoder_preset not in encoder_presets:
+            raise Exception(f"Error: unknown encoder preset {encoder_preset}, expected one of {', '.join(encoder_presets)}")
+        self.encoder_preset = encoder_preset
+        if export_format not in export_formats:
+            raise Exception(f"Error: unknown export format {export_format}, expected one of {', '.join(export_formats)}")
+        self.export_format = export_format
+        self.encode_cache = TexEncodeCache(encode_cache_dir, encode_cache_size) if encode_cache_dir is not None else None
+        self.strip_workers = strip_workers
+        self.dedup = dedup
+        self.similar_distance = similar_distance
 
     def export_file(self, input_filepath: Path, output_filepath: Path):
-        tex = Tex(input_filepath)
+        tex = Tex(input_filepath, cache=self.cache)
         try_create_dir(str(output_filepath))
-        tex.export_file(str(output_filepath) + '.png')
+        extension, compress_level = export_formats[self.export_format]
+        tex.export_file(str(output_filepath) + '.' + extension, compress_level)
 
-    def import_file(self, input_filepath: Path, file_to_import: Path):
-        tex = Tex(input_filepath)
+    def import_file(self, input_filepath: Path, file_to_import: Path) -> Tex:
+        # the mipmaps are only read if the imported image has to be compared with the current one
+        tex = Tex(input_filepath, cache=self.cache, encode_cache=self.encode_cache)
         tex.import_file(file_to_import)
-        tex.save(input_filepath)
+        tex.strip_workers = self.strip_workers
+        tex.save(input_filepath, self.encoder_preset)
+        return tex
+
+    def import_mod_files(self, jobs : list[tuple[Path, Path, Path]]) -> list[str]:
+        """
+        Imports identical files into textures storing the same kind of blocks: the file is encoded for the first texture only,
+        and its blocks are swizzled into the other ones (if that import fails, the next texture is encoded instead).
+        A texture the blocks can't be copied into is imported on its own.
+        Returns, for each job, None on success or the formatted traceback of its error.
+        """
+        errors = []
+        imported_tex = None
+        for root_dir_filepath, mod_dir_filepath, file_to_import in jobs:
+            try:
+                if not mod_dir_filepath.exists():
+                    try_create_dir(mod_dir_filepath)
+                    shutil.copy(root_dir_filepath, mod_dir_filepath)
+                if imported_tex is None:
+                    imported_tex = self.import_file(mod_dir_filepath, file_to_import)
+                else:
+                    try:
+                        tex = Tex(mod_dir_filepath, header_only=True)
+                        tex.import_blocks(imported_tex)
+                    except Exception:
+                        self.import_file(mod_dir_filepath, file_to_import)
+                    else:
+                        tex.save(mod_dir_filepath)
+                errors.append(None)
+            except Exception:
+                errors.append(traceback.format_exc())
+        return errors
+
+    def get_import_jobs(self, root_dir: Path, mod_dir: Path, files_dir: Path) -> list[tuple[Path, Path, Path]]:
+        # the sidecars of raw images are read with them, not imported
+        return [job for job in super().get_import_jobs(root_dir, mod_dir, files_dir) if not is_sidecar(job[0])]
+
+    def batch_export_file(self, root_dir: Path, output_dir: Path, langext: str):
+        if self.workers == 1:
+            return super().batch_export_file(root_dir, output_dir, langext)
+        return self.parallel_batch_export_file(root_dir, output_dir, langext, self.workers)
+
+    def batch_import_file(self, root_dir: Path, mod_dir: Path, files_dir: Path):
+        if self.workers == 1:
+            return super().batch_import_file(root_dir, mod_dir, files_dir)
+        if self.dedup:
+            return self.dedup_batch_import_file(root_dir, mod_dir, files_dir, self.workers)
+        return self.parallel_batch_import_file(root_dir, mod_dir, files_dir, self.workers)
+
+    def dedup_batch_import_file(self, root_dir : Path, mod_dir : Path, files_dir : Path, workers : int = None) -> str:
+        """
+        Hashes every imported file, groups the imports of identical files into textures storing the same kind of blocks,
+        and runs one import_mod_files job per group in a process pool ; successes and errors are counted per file.
+        """
+        jobs = self.get_import_jobs(root_dir, mod_dir, files_dir)
+        groups : dict[tuple, list[tuple[Path, Path, Path]]] = {}
+        index = ContentIndex()
+        for abs_path, root_dir_filepath, mod_dir_filepath in jobs:
+            file_hash, blocks_key = get_import_key(abs_path, mod_dir_filepath if mod_dir_filepath.exists() else root_dir_filepath)
+            index.add(str(abs_path), file_hash)
+            groups.setdefault((file_hash, blocks_key), []).append((root_dir_filepath, mod_dir_filepath, abs_path))
+
+        log = ""
+        success = 0
+        failure = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            try:
+                if self.similar_distance is not None:
+                    unique_paths = [group[0] for group in index.get_groups()]
+                    for name, perceptual_hash in zip(unique_paths, executor.map(get_perceptual_hash, unique_paths)):
+                        index.add(name, index.exact_hashes[name], perceptual_hash)
+                futures = {executor.submit(self.import_mod_files, group) : group for group in groups.values()}
+                for future in as_completed(futures):
+                    group = futures[future]
+                    try:
+                        errors = future.result()
+                    except Exception:
+                        errors = [traceback.format_exc()] * len(group)
+                    for (_, _, abs_path), error in zip(group, errors):
+                        if error is None:
+                            print(f"Imported {abs_path}")
+                            success += 1
+                        else:
+                            print(f"An error occured while trying to import {abs_path}")
+                            log += f"Error for file {abs_path}\n\n"
+                            log += error
+                            log += ('-' * 20) + '\n\n'
+                            failure += 1
+
+            except KeyboardInterrupt:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise KeyboardInterrupt("")
+
+        output_mes = self.batch_result(log, success, failure)
+        output_mes += f"{self.name}: {len(jobs)} imports, {len(groups)} encoded (dedup ratio {len(jobs) / max(1, len(groups)):.2f}).\n"
+        if self.similar_distance is not None:
+            for group in index.get_similar(self.similar_distance):
+                output_mes += f"Similar but not identical source images: {', '.join(group)}\n"
+        return output_mes
@@ -0,0 +1,100 @@
+from pathlib import Path
+from PIL import Image
+import numpy as np
+
+from .Tex import Tex
+from .TexCache import get_file_hash, get_image_hash
+from .RawImage import read_raw_image
+
+def get_perceptual_hash(image : Image.Image) -> int:
+    """
+    64-bit difference hash: each bit tells whether a pixel of the 9x8 grayscale thumbnail is brighter than its right neighbour.
+    Near-identical images (resaved, recompressed, slightly retouched) get hashes only a few bits apart.
+    """
+    gray = np.asarray(image.convert(mode='L').resize((9, 8), Image.Resampling.BILINEAR), dtype=np.int16)
+    return int(np.packbits(gray[:, 1:] > gray[:, :-1]).view('>u8')[0])
+
+def load_image(filepath : Path) -> Image.Image:
+    """
+    Opens a source image (any PIL format or .rgba) or decodes the top mipmap of a .tex file, as RGBA.
+    """
+    filepath = Path(filepath)
+    if '.tex.' in filepath.name and filepath.suffix[1:].isdigit():
+        return Tex(filepath).image
+    if filepath.suffix.lower() == '.rgba':
+        return read_raw_image(filepath)
+    with Image.open(filepath) as image:
+        return image.convert(mode='RGBA') if image.mode != 'RGBA' else image.copy()
+
+def get_file_hashes(filepath : Path, perceptual : bool = False) -> tuple[str, int]:
+    """
+    Returns the (exact, perceptual) hashes of an image file or texture ; the perceptual hash is None unless requested.
+    DDS files are imported as raw blocks, so their exact hash is the one of the file content, without a perceptual hash.
+    """
+    if Path(filepath).suffix.lower() == '.dds':
+        return "dds_" + get_file_hash(filepath), None
+    image = load_image(filepath)
+    return get_image_hash(image), get_perceptual_hash(image) if perceptual else None
+
+class ContentIndex:
+    """
+    Exact (pixel hash) and optionally perceptual hashes of source images and decoded textures, to find the duplicates
+    that only have to be encoded once and the near-duplicates that are worth a look.
+    """
+    def __init__(self, perceptual : bool = False):
+        self.perceptual = perceptual
+        self.exact_hashes : dict[str, str] = {}
+        self.perceptual_hashes : dict[str, int] = {}
+
+    def add(self, name : str, exact_hash : str, perceptual_hash : int = None):
+        self.exact_hashes[name] = exact_hash
+        if perceptual_hash is not None:
+            self.perceptual_hashes[name] = perceptual_hash
+
+    def add_image(self, name : str, image : Image.Image):
+        self.add(name, get_image_hash(image), get_perceptual_hash(image) if self.perceptual else None)
+
+    def add_file(self, filepath : Path):
+        self.add(str(filepath), *get_file_hashes(filepath, self.perceptual))
+
+    def get_groups(self) -> list[list[str]]:
+        """
+        Names grouped by identical content, in insertion order (unique entries are groups of one).
+        """
+        groups : dict[str, list[str]] = {}
+        for name, exact_hash in self.exact_hashes.items():
+            groups.setdefault(exact_hash, []).append(name)
+        return list(groups.values())
+
+    def get_duplicates(self) -> list[list[str]]:
+        return [group for group in self.get_groups() if len(group) > 1]
+
+    def get_dedup_ratio(self) -> float:
+        """
+        Number of entries per unique content (1.0: no duplicates).
+        """
+        unique_count = len(set(self.exact_hashes.values()))
+        return len(self.exact_hashes) / unique_count if unique_count else 1.0
+
+    def get_similar(self, max_distance : int = 4) -> list[list[str]]:
+        """
+        Groups of different contents whose perceptual hashes are at most max_distance bits apart (single linkage) ;
+        each content is represented by its first name.
+        """
+        names = [group[0] for group in self.get_groups() if group[0] in self.perceptual_hashes]
+        hashes = np.array([self.perceptual_hashes[name] for name in names], dtype=np.uint64)
+        parents = list(range(len(names)))
+        def find(idx : int) -> int:
+            while parents[idx] != idx:
+                parents[idx] = parents[parents[idx]]
+                idx = parents[idx]
+            return idx
+        for idx in range(len(names) - 1):
+            # popcount of the xor with every following hash
+            distances = np.unpackbits((hashes[idx + 1:] ^ hashes[idx]).view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+            for other_idx in np.nonzero(distances <= max_distance)[0] + idx + 1:
+                parents[find(int(other_idx))] = find(idx)
+        groups : dict[int, list[str]] = {}
+        for idx, name in enumerate(names):
+            groups.setdefault(find(idx), []).append(name)
+        return [group for group in groups.values() if len(group) > 1]
@@ -0,0 +1,138 @@
+from ....io import LittleEndianBinaryFileReader, LittleEndianBinaryFileWriter
+from pathlib import Path
+from .Formats import TexFormat, getformat
+
+DDSD_CAPS = 0x1
+DDSD_HEIGHT = 0x2
+DDSD_WIDTH = 0x4
+DDSD_PITCH = 0x8
+DDSD_PIXELFORMAT = 0x1000
+DDSD_MIPMAPCOUNT = 0x20000
+DDSD_LINEARSIZE = 0x80000
+DDPF_FOURCC = 0x4
+DDSCAPS_COMPLEX = 0x8
+DDSCAPS_TEXTURE = 0x1000
+DDSCAPS_MIPMAP = 0x400000
+D3D10_RESOURCE_DIMENSION_TEXTURE2D = 3
+
+# fourCCs of DDS files written without the DX10 header, as tex format ids
+legacy_fourccs = {
+    b'DXT1' : 0x47,
+    b'DXT3' : 0x4a,
+    b'DXT5' : 0x4d,
+    b'ATI1' : 0x50,
+    b'BC4U' : 0x50,
+    b'ATI2' : 0x53,
+    b'BC5U' : 0x53,
+}
+
+# tex format ids below 0x400 are DXGI formats ; ASTC formats (typeless, unorm, srgb for each block size) use
+# the DXGI values reserved for ASTC (133 for 4x4 typeless, then 4 values per block size), as read by most ASTC-aware tools
+ASTC_FIRST_TEX_FORMAT = 0x401
+ASTC_LAST_TEX_FORMAT = 0x42a
+ASTC_FIRST_DXGI_FORMAT = 133
+
+def tex_format_to_dxgi(format_id : int) -> int:
+    if ASTC_FIRST_TEX_FORMAT <= format_id <= ASTC_LAST_TEX_FORMAT:
+        block_size_idx, variant = divmod(format_id - ASTC_FIRST_TEX_FORMAT, 3)
+        return ASTC_FIRST_DXGI_FORMAT + block_size_idx * 4 + variant
+    return format_id
+
+def dxgi_to_tex_format(dxgi_format : int) -> int:
+    if dxgi_format >= ASTC_FIRST_DXGI_FORMAT:
+        block_size_idx, variant = divmod(dxgi_format - ASTC_FIRST_DXGI_FORMAT, 4)
+        return ASTC_FIRST_TEX_FORMAT + block_size_idx * 3 + variant
+    return dxgi_format
+
+def get_level_size(tex_format : TexFormat, width : int, height : int) -> int:
+    block_width, block_height = tex_format.block_size
+    return -(-width // block_width) * -(-height // block_height) * tex_format.bytes_per_block
+
+class DDS:
+    """
+    2D DDS texture holding the raw (linear) blocks of every mipmap level, without any decoding.
+    Files are written with a DX10 header ; DX10 files and the legacy DXT1/DXT3/DXT5/ATI1/ATI2 fourCCs can be read.
+    """
+    def __init__(self, width : int, height : int, format_id : int, mipmaps : list[bytes]):
+        self.width = width
+        self.height = height
+        self.format_id = format_id # tex format id
+        self.tex_format = getformat(format_id)
+        self.mipmaps = mipmaps
+
+    @staticmethod
+    def read(dds_filepath : Path) -> "DDS":
+        with LittleEndianBinaryFileReader(dds_filepath) as f:
+            magic = f.read(4)
+            if magic != b'DDS ':
+                raise Exception(f'Error: Invalid magic ; expected "DDS ", got {magic}')
+            f.seek(0xc)
+            height = f.readuint32()
+            width = f.readuint32()
+            f.seek(0x1c)
+            mipmap_count = max(1, f.readuint32())
+            f.seek(0x50)
+            pixel_format_flags = f.readuint32()
+            fourcc = f.read(4)
+            if not pixel_format_flags & DDPF_FOURCC:
+                raise Exception("Error: uncompressed DDS without a DX10 header aren't supported")
+            f.seek(0x80)
+            if fourcc == b'DX10':
+                format_id = dxgi_to_tex_format(f.readuint32())
+                resource_dimension = f.readuint32()
+                f.readuint32() # misc flags
+                array_size = f.readuint32()
+                f.readuint32() # misc flags 2
+                if resource_dimension != D3D10_RESOURCE_DIMENSION_TEXTURE2D or array_size != 1:
+                    raise Exception("Error: only single 2D DDS textures are supported")
+            elif fourcc in legacy_fourccs:
+                format_id = legacy_fourccs[fourcc]
+            else:
+                raise Exception(f"Error: unsupported DDS fourCC {fourcc}")
+
+            tex_format = getformat(format_id)
+            mipmaps = []
+            for idx in range(mipmap_count):
+                size = get_level_size(tex_format, max(1, width >> idx), max(1, height >> idx))
+                data = f.read(size)
+                if len(data) != size:
+                    raise Exception(f"Error: {dds_filepath} is truncated at mipmap {idx}")
+                mipmaps.append(data)
+        return DDS(width, height, format_id, mipmaps)
+
+    def write(self, dds_filepath : Path):
+        block_width, block_height = self.tex_format.block_size
+        flags = DDSD_CAPS | DDSD_HEIGHT | DDSD_WIDTH | DDSD_PIXELFORMAT | DDSD_MIPMAPCOUNT
+        if (block_width, block_height) == (1, 1):
+            flags |= DDSD_PITCH
+            pitch_or_linear_size = self.width * self.tex_format.bytes_per_block
+        else:
+            flags |= DDSD_LINEARSIZE
+            pitch_or_linear_size = len(self.mipmaps[0])
+        caps = DDSCAPS_TEXTURE
+        if len(self.mipmaps) > 1:
+            caps |= DDSCAPS_COMPLEX | DDSCAPS_MIPMAP
+
+        with LittleEndianBinaryFileWriter(dds_filepath) as f:
+            f.write(b'DDS ')
+            f.writeuint32(124) # header size
+            f.writeuint32(flags)
+            f.writeuint32(self.height)
+            f.writeuint32(self.width)
+            f.writeuint32(pitch_or_linear_size)
+            f.writeuint32(0) # depth
+            f.writeuint32(len(self.mipmaps))
+            f.write(b'\x00' * 44) # reserved
+            f.writeuint32(32) # pixel format size
+            f.writeuint32(DDPF_FOURCC)
+            f.write(b'DX10')
+            f.write(b'\x00' * 20) # rgb bit count and masks
+            f.writeuint32(caps)
+            f.write(b'\x00' * 16) # caps 2-4 and reserved
+            f.writeuint32(tex_format_to_dxgi(self.format_id))
+            f.writeuint32(D3D10_RESOURCE_DIMENSION_TEXTURE2D)
+            f.writeuint32(0) # misc flags
+            f.writeuint32(1) # array size
+            f.writeuint32(0) # misc flags 2
+            for data in self.mipmaps:
+                f.write(data)
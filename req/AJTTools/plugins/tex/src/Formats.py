@@ -1,27 +1,98 @@
 import texture2ddecoder
 import etcpak
+import threading
+import os
+import numpy as np
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from astc_encoder import (
  ASTCConfig,
  ASTCContext,
  ASTCImage,
  ASTCProfile,
+ ASTCQualityPreset,
  ASTCSwizzle,
  ASTCType,
 )
 
+# encoder speed/quality presets, from fastest to best quality ; "medium" is the encoders' default
+encoder_presets = ["fastest", "fast", "medium", "thorough", "verythorough", "exhaustive"]
+
+astc_qualities = {
+    "fastest" : ASTCQualityPreset.FASTEST,
+    "fast" : ASTCQualityPreset.FAST,
+    "medium" : ASTCQualityPreset.MEDIUM,
+    "thorough" : ASTCQualityPreset.THOROUGH,
+    "verythorough" : ASTCQualityPreset.VERYTHOROUGH,
+    "exhaustive" : ASTCQualityPreset.EXHAUSTIVE,
+}
+
+bc7_settings = { # (uber level, max partitions)
+    "fastest" : (0, 0),
+    "fast" : (0, 16),
+    "medium" : (0, 64),
+    "thorough" : (1, 64),
+    "verythorough" : (2, 64),
+    "exhaustive" : (4, 64),
+}
+
+def get_bc7_params(preset : str) -> etcpak.BC7CompressBlockParams:
+    params = etcpak.BC7CompressBlockParams()
+    params.m_uber_level, params.m_max_partitions = bc7_settings[preset]
+    return params
+
+bc7_params = {preset : get_bc7_params(preset) for preset in encoder_presets}
+
+# ASTC contexts are costly to create and can't compress two images at once, so the idle ones are kept for the whole process,
+# per (profile, block size, preset), and checked out by one encode at a time ; the encode threads change on every save
+astc_contexts : dict[tuple, list[ASTCContext]] = {}
+astc_contexts_lock = threading.Lock()
+
+@contextmanager
+def checkout_astc_context(profile : ASTCProfile, block_width : int, block_height : int, preset : str):
+    key = (profile, block_width, block_height, preset)
+    with astc_contexts_lock:
+        idle_contexts = astc_contexts.setdefault(key, [])
+        context = idle_contexts.pop() if idle_contexts else None
+    if context is None:
+        context = ASTCContext(ASTCConfig(profile, block_width, block_height, quality=astc_qualities[preset]))
+    try:
+        yield context
+    finally:
+        with astc_contexts_lock:
+            astc_contexts[key].append(context)
+
 class TexFormat:
     bits_per_pixel : int
     bytes_per_block : int
     pitch_type : int
     id : int
     block_size : int
+    strip_executor : type = None # pool that encode_strips splits large images over ; None: always a single encode call
 
-    def encode(self, data : bytes, width :int, height : int) -> bytes:
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
         pass
 
     def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
         pass
 
+def rgba_array(data : bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, 4)
+
+def unorm8_to_unorm(values : np.ndarray, max_value : int) -> np.ndarray:
+    return (values.astype(np.uint32) * max_value + 127) // 255
+
+def unorm_to_unorm8(values : np.ndarray, max_value : int) -> np.ndarray:
+    return ((values.astype(np.uint32) * 255 + max_value // 2) // max_value).astype(np.uint8)
+
+def channels_to_rgba(r : np.ndarray = None, g : np.ndarray = None, b : np.ndarray = None, a : np.ndarray = None, pixel_count : int = 0) -> bytes:
+    rgba = np.zeros((pixel_count, 4), dtype=np.uint8)
+    rgba[:, 3] = 0xff
+    for channel_idx, channel in enumerate([r, g, b, a]):
+        if channel is not None:
+            rgba[:, channel_idx] = channel
+    return rgba.tobytes()
+
 class R8G8B8A8_UNORM(TexFormat):
     bits_per_pixel = 32
     bytes_per_block = 4
@@ -29,12 +100,120 @@ class R8G8B8A8_UNORM(TexFormat):
     id = 0x1c
     block_size = (1,1)
 
-    def encode(self, data : bytes, width :int, height : int) -> bytes:
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
         return data
 
     def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
         return data, 'RGBA'
-    
+
+class B8G8R8A8_UNORM(TexFormat):
+    bits_per_pixel = 32
+    bytes_per_block = 4
+    pitch_type = 2
+    id = 0x57
+    block_size = (1,1)
+
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
+        return np.ascontiguousarray(rgba_array(data)[:, [2, 1, 0, 3]]).tobytes()
+
+    def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
+        return data, 'BGRA'
+
+class B8G8R8X8_UNORM(TexFormat):
+    bits_per_pixel = 32
+    bytes_per_block = 4
+    pitch_type = 2
+    id = 0x58
+    block_size = (1,1)
+
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
+        bgrx = rgba_array(data)[:, [2, 1, 0, 3]]
+        bgrx[:, 3] = 0xff
+        return bgrx.tobytes()
+
+    def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
+        rgbx = rgba_array(data)[:, [2, 1, 0, 3]]
+        rgbx[:, 3] = 0xff
+        return rgbx.tobytes(), 'RGBA'
+
+class R10G10B10A2_UNORM(TexFormat):
+    bits_per_pixel = 32
+    bytes_per_block = 4
+    pitch_type = 3
+    id = 0x18
+    block_size = (1,1)
+
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
+        rgba = rgba_array(data)
+        packed = unorm8_to_unorm(rgba[:, 0], 0x3ff)
+        packed |= unorm8_to_unorm(rgba[:, 1], 0x3ff) << 10
+        packed |= unorm8_to_unorm(rgba[:, 2], 0x3ff) << 20
+        packed |= unorm8_to_unorm(rgba[:, 3], 0x3) << 30
+        return packed.astype('<u4').tobytes()
+
+    def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
+        packed = np.frombuffer(data, dtype='<u4')
+        return channels_to_rgba(unorm_to_unorm8(packed & 0x3ff, 0x3ff),
+                                unorm_to_unorm8((packed >> 10) & 0x3ff, 0x3ff),
+                                unorm_to_unorm8((packed >> 20) & 0x3ff, 0x3ff),
+                                unorm_to_unorm8(packed >> 30, 0x3),
+                                len(packed)), 'RGBA'
+
+class R16G16B16A16_UNORM(TexFormat):
+    bits_per_pixel = 64
+    bytes_per_block = 8
+    pitch_type = 3
+    id = 0x0b
+    block_size = (1,1)
+
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
+        return (rgba_array(data).astype('<u2') * 257).tobytes()
+
+    def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
+        return unorm_to_unorm8(np.frombuffer(data, dtype='<u2'), 0xffff).tobytes(), 'RGBA'
+
+class R16G16_UNORM(TexFormat):
+    bits_per_pixel = 32
+    bytes_per_block = 4
+    pitch_type = 3
+    id = 0x23
+    block_size = (1,1)
+
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
+        return (rgba_array(data)[:, :2].astype('<u2') * 257).tobytes()
+
+    def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
+        rg = unorm_to_unorm8(np.frombuffer(data, dtype='<u2'), 0xffff).reshape(-1, 2)
+        return channels_to_rgba(rg[:, 0], rg[:, 1], pixel_count=len(rg)), 'RGBA'
+
+class R16_UNORM(TexFormat):
+    bits_per_pixel = 16
+    bytes_per_block = 2
+    pitch_type = 3
+    id = 0x38
+    block_size = (1,1)
+
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
+        return (rgba_array(data)[:, 0].astype('<u2') * 257).tobytes()
+
+    def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
+        r = unorm_to_unorm8(np.frombuffer(data, dtype='<u2'), 0xffff)
+        return channels_to_rgba(r, pixel_count=len(r)), 'RGBA'
+
+class R8G8_UNORM(TexFormat):
+    bits_per_pixel = 16
+    bytes_per_block = 2
+    pitch_type = 3
+    id = 0x31
+    block_size = (1,1)
+
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
+        return np.ascontiguousarray(rgba_array(data)[:, :2]).tobytes()
+
+    def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
+        rg = np.frombuffer(data, dtype=np.uint8).reshape(-1, 2)
+        return channels_to_rgba(rg[:, 0], rg[:, 1], pixel_count=len(rg)), 'RGBA'
+
 class R8_UNORM(TexFormat):
     bits_per_pixel = 8
     bytes_per_block = 1
@@ -42,17 +221,26 @@ class R8_UNORM(TexFormat):
     id = 0x3d
     block_size = (1,1)
 
-    def encode(self, data : bytes, width : int, height : int) -> bytes:
-        enc_data = b""
-        for i in range(len(data) // 4):
-            enc_data += data[4*i:4*i+1]
-        return enc_data
+    def encode(self, data : bytes, width : int, height : int, preset : str = "medium") -> bytes:
+        return data[0::4]
     
     def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
-        dec_data = b""
-        for r in data:
-            dec_data += r.to_bytes(1,'little') + b'\x00\x00\xff'
-        return dec_data, 'RGBA'
+        r = np.frombuffer(data, dtype=np.uint8)
+        return channels_to_rgba(r, pixel_count=len(r)), 'RGBA'
+
+class A8_UNORM(TexFormat):
+    bits_per_pixel = 8
+    bytes_per_block = 1
+    pitch_type = 3
+    id = 0x41
+    block_size = (1,1)
+
+    def encode(self, data : bytes, width : int, height : int, preset : str = "medium") -> bytes:
+        return data[3::4]
+
+    def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
+        a = np.frombuffer(data, dtype=np.uint8)
+        return channels_to_rgba(np.zeros_like(a), np.zeros_like(a), np.zeros_like(a), a, len(a)), 'RGBA'
 
 class BC1_UNORM(TexFormat):
     bits_per_pixel = 4
@@ -61,7 +249,7 @@ class BC1_UNORM(TexFormat):
     id = 0x47
     block_size = (4,4)
 
-    def encode(self, data : bytes, width :int, height : int) -> bytes:
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
         return etcpak.compress_bc1(data, width, height)
 
     def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
@@ -74,7 +262,7 @@ class BC3_UNORM(TexFormat):
     id = 0x4d
     block_size = (4,4)
 
-    def encode(self, data : bytes, width :int, height : int) -> bytes:
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
         return etcpak.compress_bc3(data, width, height)
 
     def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
@@ -87,7 +275,7 @@ class BC4_UNORM(TexFormat):
     id = 0x50
     block_size = (4,4)
 
-    def encode(self, data : bytes, width :int, height : int) -> bytes:
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
         return etcpak.compress_bc4(data, width, height)
 
     def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
@@ -100,20 +288,20 @@ class BC5_UNORM(TexFormat):
     id = 0x53
     block_size = (4,4)
 
-    def encode(self, data : bytes, width :int, height : int) -> bytes:
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
         return etcpak.compress_bc5(data, width, height)
 
     def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
         return texture2ddecoder.decode_bc5(data, width, height) , 'BGRA'
     
-class BC6H_UF16:
+class BC6H_UF16(TexFormat):
     bits_per_pixel = 8
     bytes_per_block = 16
     pitch_type = 1
     id = 0x5e
     block_size = (4,4)
 
-    def encode(self, data : bytes, width :int, height : int) -> bytes:
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
         raise Exception("BC6 encode isn't implemented.")
 
     def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
@@ -125,9 +313,10 @@ class BC7_UNORM(TexFormat):
     pitch_type = 1
     id = 0x62
     block_size = (4,4)
+    strip_executor = ProcessPoolExecutor # etcpak holds the GIL while compressing
 
-    def encode(self, data : bytes, width :int, height : int) -> bytes:
-        return etcpak.compress_bc7(data, width, height)
+    def encode(self, data : bytes, width :int, height : int, preset : str = "medium") -> bytes:
+        return etcpak.compress_bc7(data, width, height, bc7_params[preset])
 
     def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
         return texture2ddecoder.decode_bc7(data, width, height) , 'BGRA'
@@ -135,6 +324,7 @@ class BC7_UNORM(TexFormat):
 class ASTC_UNORM(TexFormat):
     bytes_per_block = 16
     pitch_type = 3
+    strip_executor = ThreadPoolExecutor # the ASTC encoder releases the GIL
 
     def __init__(self,block_width: int, block_height : int):
         self.block_size = (block_width,block_height)
@@ -142,23 +332,30 @@ class ASTC_UNORM(TexFormat):
         self.block_height = block_height
         self.bits_per_pixel = (self.bytes_per_block * 8) / (self.block_width * self.block_height)
     
-    def encode(self, data : bytes, width : int, height : int) -> bytes:
-        config = ASTCConfig(ASTCProfile.LDR_SRGB, self.block_width, self.block_height)
-        context = ASTCContext(config)
+    def encode(self, data : bytes, width : int, height : int, preset : str = "medium") -> bytes:
         image = ASTCImage(ASTCType.U8, dim_x = width, dim_y = height, data=data)
         swizzle = ASTCSwizzle()
-        comp = context.compress(image, swizzle)
+        with checkout_astc_context(ASTCProfile.LDR_SRGB, self.block_width, self.block_height, preset) as context:
+            comp = context.compress(image, swizzle)
         return comp
     
     def decode(self, data : bytes, width : int, height : int) -> tuple[bytes,str]:
         return texture2ddecoder.decode_astc(data, width, height,self.block_width,self.block_height) , 'BGRA'
 
 formats = {
+0x0b:R16G16B16A16_UNORM(),
+0x17:R10G10B10A2_UNORM(),
+0x18:R10G10B10A2_UNORM(),
 0x1b:R8G8B8A8_UNORM(),
 0x1c:R8G8B8A8_UNORM(),
 0x1d:R8G8B8A8_UNORM(),
+0x23:R16G16_UNORM(),
+0x30:R8G8_UNORM(),
+0x31:R8G8_UNORM(),
+0x38:R16_UNORM(),
 0x3c:R8_UNORM(),
 0x3d:R8_UNORM(),
+0x41:A8_UNORM(),
 0x46:BC1_UNORM(),
 0x47:BC1_UNORM(),
 0x48:BC1_UNORM(),
@@ -172,6 +369,12 @@ formats = {
 0x52:BC5_UNORM(),
 0x53:BC5_UNORM(),
 0x54:BC5_UNORM(),
+0x57:B8G8R8A8_UNORM(),
+0x58:B8G8R8X8_UNORM(),
+0x5a:B8G8R8A8_UNORM(),
+0x5b:B8G8R8A8_UNORM(),
+0x5c:B8G8R8X8_UNORM(),
+0x5d:B8G8R8X8_UNORM(),
 0x5e:BC6H_UF16(),
 0x5f:BC6H_UF16(),
 0x61:BC7_UNORM(),
@@ -221,6 +424,33 @@ formats = {
 0x042a:ASTC_UNORM(12,12)
 }
 
+# images under this pixel count are encoded in one call, as the pool would cost more than it saves
+STRIP_MIN_PIXELS = 1024 * 1024
+STRIP_MIN_BLOCK_ROWS = 16
+
+def encode_strips(tex_format : TexFormat, data : bytes, width : int, height : int, preset : str = "medium", workers : int = None) -> bytes:
+    """
+    Encodes RGBA data as horizontal strips of whole block rows on a pool of workers (None: one per CPU), and
+    concatenates the blocks of the strips in order. Blocks are encoded independently, so the result is the one
+    of tex_format.encode for deterministic encoders (etcpak, astc_encoder).
+    Only the slow encoders (BC7, ASTC) are split, on the pool type of their strip_executor ; other formats,
+    small images and workers=1 use a single encode call.
+    """
+    workers = workers or os.cpu_count()
+    block_height = tex_format.block_size[1]
+    block_row_count = -(-height // block_height)
+    if workers == 1 or tex_format.strip_executor is None or width * height < STRIP_MIN_PIXELS or block_row_count < 2 * STRIP_MIN_BLOCK_ROWS:
+        return tex_format.encode(data, width, height, preset)
+
+    # a few strips per worker, so that a slow strip doesn't leave the other workers idle
+    strip_block_rows = max(STRIP_MIN_BLOCK_ROWS, -(-block_row_count // (4 * workers)))
+    strip_height = strip_block_rows * block_height
+    row_size = width * 4
+    strips = [(start, min(height, start + strip_height)) for start in range(0, height, strip_height)]
+    with tex_format.strip_executor(max_workers=min(workers, len(strips))) as executor:
+        futures = [executor.submit(tex_format.encode, data[start * row_size:end * row_size], width, end - start, preset) for start, end in strips]
+        return b''.join(future.result() for future in futures)
+
 def getformat(id : int) -> TexFormat:
     try:
         return formats[id]
@@ -238,7 +468,6 @@ unsupported_formats = {
 0x08:"R32G32B32_SINT",
 0x09:"R16G16B16A16_TYPELESS",
 0x0a:"R16G16B16A16_FLOAT",
-0x0b:"R16G16B16A16_UNORM",
 0x0c:"R16G16B16A16_UINT",
 0x0d:"R16G16B16A16_SNORM",
 0x0e:"R16G16B16A16_SINT",
@@ -250,8 +479,6 @@ unsupported_formats = {
 0x14:"D32_FLOAT_S8X24_UINT",
 0x15:"R32_FLOAT_X8X24_TYPELESS",
 0x16:"X32_TYPELESS_G8X24_UINT",
-0x17:"R10G10B10A2_TYPELESS",
-0x18:"R10G10B10A2_UNORM",
 0x19:"R10G10B10A2_UINT",
 0x1a:"R11G11B10_FLOAT",
 0x1e:"R8G8B8A8_UINT",
@@ -259,7 +486,6 @@ unsupported_formats = {
 0x20:"R8G8B8A8_SINT",
 0x21:"R16G16_TYPELESS",
 0x22:"R16G16_FLOAT",
-0x23:"R16G16_UNORM",
 0x24:"R16G16_UINT",
 0x25:"R16G16_SNORM",
 0x26:"R16G16_SINT",
@@ -272,22 +498,18 @@ unsupported_formats = {
 0x2d:"D24_UNORM_S8UINT",
 0x2e:"R24_UNORM_X8_TYPELESS",
 0x2f:"X24_TYPELESS_G8_UINT",
-0x30:"R8G8_TYPELESS",
-0x31:"R8G8_UNORM",
 0x32:"R8G8_UINT",
 0x33:"R8G8_SNORM",
 0x34:"R8G8_SINT",
 0x35:"R16_TYPELESS",
 0x36:"R16_FLOAT",
 0x37:"D16_UNORM",
-0x38:"R16_UNORM",
 0x39:"R16_UINT",
 0x3a:"R16_SNORM",
 0x3b:"R16_SINT",
 0x3e:"R8_UINT",
 0x3f:"R8_SNORM",
 0x40:"R8_SINT",
-0x41:"A8_UNORM",
 0x42:"R1_UNORM",
 0x43:"R9G9B9E5_SHAREDEXP",
 0x44:"R8G8B8G8_UNORM",
@@ -297,14 +519,8 @@ unsupported_formats = {
 0x4b:"BC2_UNORM_SRGB",
 0x55:"B5G6R5_UNORM",
 0x56:"B5G5R5A1_UNORM",
-0x57:"B8G8R8A8_UNORM",
-0x58:"B8G8R8X8_UNORM",
 0x59:"R10G10B10_XRBIASA2_UNORM",
-0x5a:"B8G8R8A8_TYPELESS",
-0x5b:"B8G8R8A8_UNORM_SRGB",
-0x5c:"B8G8R8X8_TYPELESS",
-0x5d:"B8G8R8X8_UNORM_SRGB",
 0x60:"BC6H_SF16",
 0x0400:"VIAEXTENSION",
 0x7fffffff:"FORCE_UINT"
-}
\ No newline at end of file
+}
@@ -0,0 +1,89 @@
+from pathlib import Path
+import numpy as np
+import struct
+import zlib
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_FILTERS = np.array([0, 1, 2, 4], dtype=np.uint8) # none, sub, up, paeth
+FILTER_CHUNK_SIZE = 256 * 1024 # bytes of rows filtered at once
+
+class PngStreamWriter:
+    """
+    Writes an 8-bit RGBA PNG file strip by strip, so that the whole image never has to be in memory.
+    Each row gets the filter with the smallest sum of absolute values (the libpng heuristic) ; compress_level is the
+    zlib level (None: 6 like PIL, 0: stored and unfiltered).
+    """
+    def __init__(self, png_filepath : Path, width : int, height : int, compress_level : int = None):
+        self.width = width
+        self.height = height
+        self.row_count = 0
+        self.filter_rows = compress_level != 0
+        self.previous_row = np.zeros(width * 4, dtype=np.uint8)
+        self.compressor = zlib.compressobj(6 if compress_level is None else compress_level)
+        self.f = open(png_filepath, mode='wb')
+        self.f.write(PNG_SIGNATURE)
+        self.write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.f.close()
+
+    def write_chunk(self, chunk_type : bytes, data : bytes):
+        self.f.write(struct.pack('>I', len(data)))
+        self.f.write(chunk_type)
+        self.f.write(data)
+        self.f.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    def filter(self, rows : np.ndarray) -> np.ndarray:
+        filtered_rows = np.empty((len(rows), 1 + self.width * 4), dtype=np.uint8)
+        if not self.filter_rows:
+            filtered_rows[:, 0] = 0
+            filtered_rows[:, 1:] = rows
+            return filtered_rows
+        current = rows.astype(np.int16)
+        up = np.empty_like(current)
+        up[0] = self.previous_row
+        up[1:] = current[:-1]
+        left = np.zeros_like(current)
+        left[:, 4:] = current[:, :-4]
+        up_left = np.zeros_like(current)
+        up_left[:, 4:] = up[:, :-4]
+        estimate = left + up - up_left
+        left_distance, up_distance, up_left_distance = np.abs(estimate - left), np.abs(estimate - up), np.abs(estimate - up_left)
+        paeth = np.where((left_distance <= up_distance) & (left_distance <= up_left_distance), left, np.where(up_distance <= up_left_distance, up, up_left))
+        candidates = np.stack([current, current - left, current - up, current - paeth]).astype(np.uint8)
+        best = np.abs(candidates.view(np.int8).astype(np.int32)).sum(axis=2).argmin(axis=0)
+        filtered_rows[:, 0] = PNG_FILTERS[best]
+        filtered_rows[:, 1:] = candidates[best, np.arange(len(rows))]
+        return filtered_rows
+
+    def write_rows(self, rows : np.ndarray):
+        """
+        Appends the next rows of the image, as a (row count, width, 4) or (row count, width * 4) uint8 array.
+        """
+        rows = rows.reshape(len(rows), self.width * 4)
+        if self.row_count + len(rows) > self.height:
+            raise Exception(f"Error: too many rows for a {self.width}x{self.height} PNG file")
+        # the filter temporaries take about 50 bytes per byte of input, so rows are filtered a few at a time
+        chunk_row_count = max(1, FILTER_CHUNK_SIZE // (self.width * 4))
+        for start in range(0, len(rows), chunk_row_count):
+            chunk = rows[start:start + chunk_row_count]
+            compressed_data = self.compressor.compress(self.filter(chunk).tobytes())
+            if compressed_data:
+                self.write_chunk(b'IDAT', compressed_data)
+            self.previous_row = chunk[-1].copy()
+        self.row_count += len(rows)
+
+    def close(self):
+        try:
+            if self.row_count != self.height:
+                raise Exception(f"Error: {self.row_count} rows were written to a {self.width}x{self.height} PNG file")
+            self.write_chunk(b'IDAT', self.compressor.flush())
+            self.write_chunk(b'IEND', b'')
+        finally:
+            self.f.close()
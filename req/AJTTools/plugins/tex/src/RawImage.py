@@ -0,0 +1,38 @@
+from pathlib import Path
+from PIL import Image
+import json
+
+# Raw images are uncompressed RGBA8 pixels, row by row without padding, with their size in a JSON sidecar
+# next to them (<file>.json). Scripts can read them with a single numpy.fromfile, without any PNG zlib cost.
+
+def get_sidecar_path(raw_filepath : Path) -> Path:
+    return Path(str(raw_filepath) + ".json")
+
+def is_sidecar(filepath : Path) -> bool:
+    return str(filepath).lower().endswith(".rgba.json")
+
+def write_raw_sidecar(raw_filepath : Path, width : int, height : int):
+    with open(get_sidecar_path(raw_filepath), mode='w', encoding='utf-8') as f:
+        json.dump({"width" : width, "height" : height, "mode" : "RGBA"}, f)
+
+def write_raw_image(image : Image.Image, raw_filepath : Path):
+    if image.mode != 'RGBA':
+        image = image.convert(mode='RGBA')
+    with open(raw_filepath, mode='wb') as f:
+        f.write(image.tobytes())
+    write_raw_sidecar(raw_filepath, image.width, image.height)
+
+def read_raw_image(raw_filepath : Path) -> Image.Image:
+    sidecar_path = get_sidecar_path(raw_filepath)
+    try:
+        with open(sidecar_path, mode='r', encoding='utf-8') as f:
+            info = json.load(f)
+    except FileNotFoundError:
+        raise Exception(f"Error: {raw_filepath} has no {sidecar_path.name} sidecar with its size")
+    if info.get("mode", "RGBA") != "RGBA":
+        raise Exception(f"Error: unsupported raw image mode {info['mode']}, expected RGBA")
+    size = (info["width"], info["height"])
+    data = Path(raw_filepath).read_bytes()
+    if len(data) != size[0] * size[1] * 4:
+        raise Exception(f"Error: invalid raw image size ; expected {size[0] * size[1] * 4} bytes for {size[0]}x{size[1]}, got {len(data)}")
+    return Image.frombuffer('RGBA', size, data, 'raw', 'RGBA', 0, 1)
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+import threading
+import numpy as np
+
+# total size of the (platform, size, block size, bytes per block, swizzle mode) tables kept in memory ;
+# a batch only uses a handful of texture sizes, but each mipmap level is a size of its own
+SWIZZLE_TABLE_CACHE_BYTES = 256 * 1024 * 1024
+
+swizzle_tables : OrderedDict[tuple, np.ndarray] = OrderedDict()
+swizzle_tables_size = 0
+swizzle_tables_lock = threading.Lock()
+
+def get_unit_size(platform : str, bytes_per_block : int) -> int:
+    # Switch swizzles 16-byte GOB sectors whatever the format, PS4 swizzles whole blocks
+    return 16 if platform == 'nsw' else bytes_per_block
+
+def get_swizzle_table(platform : str, im_size : tuple[int, int], block_size : tuple[int, int], bytes_per_block : int, swizzle_mode : int = 0) -> np.ndarray:
+    """
+    Returns the table of build_swizzle_table from a cache of the most recently used tables, bounded by SWIZZLE_TABLE_CACHE_BYTES.
+    """
+    global swizzle_tables_size
+    key = (platform, im_size, block_size, bytes_per_block, swizzle_mode)
+    with swizzle_tables_lock:
+        table = swizzle_tables.get(key)
+        if table is not None:
+            swizzle_tables.move_to_end(key)
+            return table
+
+    table = build_swizzle_table(platform, im_size, block_size, bytes_per_block, swizzle_mode)
+    table.flags.writeable = False # shared by every caller of the cache
+    if table.nbytes > SWIZZLE_TABLE_CACHE_BYTES:
+        return table
+    with swizzle_tables_lock:
+        if key not in swizzle_tables:
+            swizzle_tables[key] = table
+            swizzle_tables_size += table.nbytes
+        while swizzle_tables_size > SWIZZLE_TABLE_CACHE_BYTES:
+            _, evicted_table = swizzle_tables.popitem(last=False)
+            swizzle_tables_size -= evicted_table.nbytes
+    return table
+
+def build_swizzle_table(platform : str, im_size : tuple[int, int], block_size : tuple[int, int], bytes_per_block : int, swizzle_mode : int = 0) -> np.ndarray:
+    """
+    For each unit (see get_unit_size) of the swizzled data, in order, the index of the same unit in the linear data.
+    The layouts are the ones of pyswizzle: Switch tiles are 64 bytes wide and 8 * 2^swizzle_mode block rows high,
+    PS4 tiles are 8x8 blocks in Morton order ; tiles are stored row by row.
+    The table is the sum of the linear offsets of the units inside one tile and of the tile offsets, broadcast
+    straight into the output dtype, so no temporary array is as large as the table.
+    """
+    im_width, im_height = im_size
+    block_width, block_height = block_size
+    if (im_width * im_height) % (block_width * block_height) != 0:
+        raise Exception(f"Error: image size {im_width}x{im_height} isn't a multiple of the block size {block_width}x{block_height}")
+    unit_size = get_unit_size(platform, bytes_per_block)
+    units_per_row = (im_width // block_width) * bytes_per_block // unit_size
+    row_count = im_height // block_height
+
+    if platform == 'nsw':
+        tile_width, tile_height = 4, 8 * 2 ** swizzle_mode
+    elif platform == 'ps4':
+        tile_width, tile_height = 8, 8
+    else:
+        raise Exception(f"Error: unknown swizzle platform {platform}")
+    if units_per_row % tile_width != 0 or row_count % tile_height != 0:
+        raise Exception(f"Error: a {im_width}x{im_height} image can't be swizzled for {platform} without padding")
+
+    dtype = np.int32 if units_per_row * row_count < 2 ** 31 else np.int64
+    tile_unit_idx = np.arange(tile_width * tile_height, dtype=dtype)
+    if platform == 'nsw':
+        column = ((tile_unit_idx >> 1) & 1) | (((tile_unit_idx >> 4) & 1) << 1)
+        row = (tile_unit_idx & 1) | (((tile_unit_idx >> 2) & 3) << 1) | ((tile_unit_idx >> 5) << 3)
+    else:
+        column = (tile_unit_idx & 1) | (((tile_unit_idx >> 2) & 1) << 1) | (((tile_unit_idx >> 4) & 1) << 2)
+        row = ((tile_unit_idx >> 1) & 1) | (((tile_unit_idx >> 3) & 1) << 1) | (((tile_unit_idx >> 5) & 1) << 2)
+    tile_pattern = row * units_per_row + column
+
+    tile_rows = np.arange(row_count // tile_height, dtype=dtype) * (tile_height * units_per_row)
+    tile_columns = np.arange(units_per_row // tile_width, dtype=dtype) * tile_width
+    tile_offsets = tile_rows[:, None] + tile_columns[None, :]
+    table = np.empty((tile_offsets.size, tile_pattern.size), dtype=dtype)
+    np.add(tile_offsets.reshape(-1, 1), tile_pattern, out=table)
+    return table.reshape(-1)
+
+def _as_units(data : bytes, platform : str, im_size : tuple[int, int], block_size : tuple[int, int], bytes_per_block : int) -> np.ndarray:
+    expected_data_size = (im_size[0] * im_size[1]) // (block_size[0] * block_size[1]) * bytes_per_block
+    if len(data) != expected_data_size:
+        raise Exception(f"Error: invalid data size for a {im_size[0]}x{im_size[1]} image ; expected {expected_data_size}, got {len(data)}")
+    return np.frombuffer(data, dtype=np.dtype((np.void, get_unit_size(platform, bytes_per_block))))
+
+def swizzle(platform : str, data : bytes, im_size : tuple[int, int], block_size : tuple[int, int], bytes_per_block : int, swizzle_mode : int = 0) -> bytes:
+    units = _as_units(data, platform, im_size, block_size, bytes_per_block)
+    return units[get_swizzle_table(platform, tuple(im_size), tuple(block_size), bytes_per_block, swizzle_mode)].tobytes()
+
+def deswizzle(platform : str, data : bytes, im_size : tuple[int, int], block_size : tuple[int, int], bytes_per_block : int, swizzle_mode : int = 0) -> bytes:
+    units = _as_units(data, platform, im_size, block_size, bytes_per_block)
+    deswizzled_units = np.empty_like(units)
+    deswizzled_units[get_swizzle_table(platform, tuple(im_size), tuple(block_size), bytes_per_block, swizzle_mode)] = units
+    return deswizzled_units.tobytes()
+
+# same signatures as the pyswizzle functions they replace
+
+def nsw_swizzle(data : bytes, im_size : tuple[int, int], block_size : tuple[int, int], bytes_per_block : int, swizzle_mode : int) -> bytes:
+    return swizzle('nsw', data, im_size, block_size, bytes_per_block, swizzle_mode)
+
+def nsw_deswizzle(data : bytes, im_size : tuple[int, int], block_size : tuple[int, int], bytes_per_block : int, swizzle_mode : int) -> bytes:
+    return deswizzle('nsw', data, im_size, block_size, bytes_per_block, swizzle_mode)
+
+def ps4_swizzle(data : bytes, im_size : tuple[int, int], block_size : tuple[int, int], bytes_per_block : int) -> bytes:
+    return swizzle('ps4', data, im_size, block_size, bytes_per_block)
+
+def ps4_deswizzle(data : bytes, im_size : tuple[int, int], block_size : tuple[int, int], bytes_per_block : int) -> bytes:
+    return deswizzle('ps4', data, im_size, block_size, bytes_per_block)
@@ -1,8 +1,16 @@
 from ....io import LittleEndianBinaryFileReader, LittleEndianBinaryFileWriter
 from .TexHeader import TexHeader
 from .TexMipmap import TexMipmap, SteamMipmap, SwitchMipmap, PS4Mipmap
+from .TexCache import TexCache, TexEncodeCache, get_file_hash, get_image_hash
+from .Formats import encoder_presets
+from .DDS import DDS
+from .RawImage import write_raw_image, write_raw_sidecar, read_raw_image
+from .PngStream import PngStreamWriter
 from PIL import Image
 from pathlib import Path
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
 mipmap_table = {
     "stm" : SteamMipmap,
@@ -10,46 +18,355 @@ mipmap_table = {
     "ps4" : PS4Mipmap
 }
 
+mipmap_filters = {
+    "nearest" : Image.Resampling.NEAREST,
+    "bilinear" : Image.Resampling.BILINEAR,
+    "bicubic" : Image.Resampling.BICUBIC,
+    "lanczos" : Image.Resampling.LANCZOS,
+}
+
+# levels from this size are decoded strip by strip (see TexMipmap.decode_strips), and exported straight to the file
+STREAM_MIN_PIXELS = 2048 * 2048
+
+def downsample(image : Image.Image, mipmap_filter : str) -> Image.Image:
+    """
+    Halves the image size, rounded down to at least one pixel like the mipmap sizes of TexMipmap.get_size.
+    The default "box" filter averages 2x2 pixels (Image.reduce), or resamples odd sizes with a box filter.
+    """
+    size = (max(1, image.width // 2), max(1, image.height // 2))
+    if mipmap_filter == "box":
+        if image.width % 2 == 0 and image.height % 2 == 0:
+            return image.reduce(2)
+        return image.resize(size, Image.Resampling.BOX)
+    return image.resize(size, mipmap_filters[mipmap_filter])
+
 class Tex:
-    def __init__(self,filepath : Path):
+    def __init__(self,filepath : Path, header_only : bool = False, cache : TexCache = None, encode_cache : TexEncodeCache = None):
+        """
+        Pixels are only decoded on the first access to image, and each mipmap's data is only read from the file when it is needed.
+        With header_only, only the TexHeader and the mipmap table are read (no mipmap data): the texture can be
+        inspected, or get a new image through import_file and be saved, but not decoded.
+        With a cache, decoded mipmaps and exported PNG files are looked up by the texture content hash before decoding.
+        encoder_preset selects the speed/quality trade-off of the BC7 and ASTC encoders (see Formats.encoder_presets).
+        With strip_workers other than 1, large mipmaps are encoded as block-row strips on that many workers (see Formats.encode_strips).
+        DDS files are exported and imported as raw blocks (see export_dds and import_dds).
+        With an encode_cache, save looks the encoded mipmaps of an imported image up before encoding them, and
+        an imported image identical to the current one keeps the original mipmap data, when the original image was
+        already decoded or is in the cache (see has_original_image).
+        """
         with LittleEndianBinaryFileReader(filepath) as f:
             self.filepath = filepath
+            self.header_only = header_only
             self.header = TexHeader(f)
             Mipmap = mipmap_table[self.header.platform]
-            self.mipmaps : list[TexMipmap] = [Mipmap(f, self.header, idx) for idx in range(self.header.mipmap_count)]
+            self.mipmaps : list[TexMipmap] = [Mipmap(f, self.header, idx, not header_only) for idx in range(self.header.mipmap_count)]
                         
             if self.header.platform in ["stm","ps4"]:
                 self.header.width = self.mipmaps[0].get_real_width_from_pitch(self.header.tex_format)
+            self.original_size = (self.header.width, self.header.height)
+
+            self._image : Image.Image = None
+            self._original_image : Image.Image = None
+            self.image_replaced : bool = False
+            self.blocks_replaced : bool = False
+            self.cache = cache
+            self.content_hash : str = None
+            self.encode_cache = encode_cache
+            self.source_hash : str = None
+            self.mipmap_filter : str = "box"
+            self.encode_workers : int = None
+            self.encoder_preset : str = "medium"
+            self.strip_workers : int = 1
+
+    @property
+    def image(self) -> Image.Image:
+        if self._image is None:
+            self._image = self.load_pil_image(0)
+        return self._image
+
+    @image.setter
+    def image(self, image : Image.Image):
+        if not self.image_replaced:
+            self._original_image = self._image
+        self._image = image
+        self.image_replaced = True
+        self.blocks_replaced = False
+        self.source_hash = None
 
-            self.image = self.load_pil_image(0)
+    def get_content_hash(self) -> str:
+        if self.content_hash is None:
+            self.content_hash = get_file_hash(self.filepath)
+        return self.content_hash
+
+    def get_cache_key(self, mipmap_idx : int) -> str:
+        return self.cache.get_key(self.get_content_hash(), mipmap_idx)
+
+    def decode_mipmap(self, mipmap_idx : int) -> Image.Image:
+        if self.header_only:
+            raise Exception(f"Error: {self.filepath} was opened in header-only mode and can't be decoded")
+        mipmap = self.mipmaps[mipmap_idx]
+        width, height = mipmap.get_size(self.header.width, self.header.height)
+        if width * height < STREAM_MIN_PIXELS:
+            return mipmap.decode(width, height)
+        # the strips are pasted as they are decoded, instead of holding the swizzled, deswizzled and decoded copies of the level
+        image = Image.new('RGBA', (width, height))
+        for y, strip in mipmap.decode_strips(width, height):
+            image.paste(strip, (0, y))
+        return image
+
+    def export_strips(self, filepath : Path, compress_level : int = None):
+        """
+        Decodes the top mipmap strip by strip straight into a PNG or .rgba file (see RawImage), so that
+        the whole image is never in memory.
+        """
+        if self.header_only:
+            raise Exception(f"Error: {self.filepath} was opened in header-only mode and can't be decoded")
+        width, height = self.header.width, self.header.height
+        strips = self.mipmaps[0].decode_strips(width, height)
+        if Path(filepath).suffix.lower() == '.rgba':
+            with open(filepath, mode='wb') as f:
+                for _, strip in strips:
+                    f.write(strip.tobytes())
+            write_raw_sidecar(filepath, width, height)
+        else:
+            with PngStreamWriter(filepath, width, height, compress_level) as png:
+                for _, strip in strips:
+                    png.write_rows(np.asarray(strip))
 
     def load_pil_image(self, mipmap_idx : int) -> Image.Image:
-        return self.mipmaps[mipmap_idx].decode(self.header.width, self.header.height)
+        if self.cache is None:
+            return self.decode_mipmap(mipmap_idx)
+        key = self.get_cache_key(mipmap_idx)
+        image = self.cache.get_image(key)
+        if image is None:
+            image = self.decode_mipmap(mipmap_idx)
+            self.cache.put_image(key, image)
+        return image
+
+    def get_thumbnail(self, max_size : tuple[int, int] = (256, 256)) -> Image.Image:
+        """
+        Returns the image scaled down to fit in max_size (keeping its aspect ratio). Only the smallest mipmap
+        at least as large as the thumbnail is read and decoded.
+        """
+        width, height = self.header.width, self.header.height
+        scale = min(max_size[0] / width, max_size[1] / height, 1)
+        thumbnail_size = (max(1, round(width * scale)), max(1, round(height * scale)))
 
-    def export_file(self,png_filepath : Path):
-        self.image.save(png_filepath)
+        if self._image is not None or self.image_replaced:
+            image = self.image
+        else:
+            mipmap_idx = 0
+            for idx, mipmap in enumerate(self.mipmaps):
+                mipmap_width, mipmap_height = mipmap.get_size(width, height)
+                if mipmap_width < thumbnail_size[0] or mipmap_height < thumbnail_size[1]:
+                    break
+                mipmap_idx = idx
+            image = self.load_pil_image(mipmap_idx)
+        if image.size == thumbnail_size:
+            return image
+        return image.resize(thumbnail_size, Image.Resampling.BILINEAR, reducing_gap=2.0)
 
-    def import_file(self, im_filepath : Path):
-        self.image : Image.Image = Image.open(im_filepath)
-        self.image = self.image.convert(mode='RGBA')
+    def export_file(self,png_filepath : Path, compress_level : int = None):
+        """
+        The format is picked from the extension: .dds (raw blocks), .rgba (raw pixels with a JSON sidecar, see RawImage)
+        or any image format PIL can write. compress_level is the zlib level of PNG files (None: PIL's default, 0: no compression).
+        """
+        suffix = Path(png_filepath).suffix.lower()
+        if suffix == '.dds':
+            self.export_dds(png_filepath)
+            return
+        key = None
+        if self.cache is not None and not self.image_replaced and suffix == '.png':
+            key = self.cache.get_export_key(self.get_content_hash(), compress_level)
+            cached_path = self.cache.get(key)
+            if cached_path is not None:
+                shutil.copyfile(cached_path, png_filepath)
+                return
+
+        # large textures that haven't been decoded yet are streamed to the file
+        if self._image is None and not self.image_replaced and suffix in ['.png', '.rgba'] and self.header.width * self.header.height >= STREAM_MIN_PIXELS:
+            self.export_strips(png_filepath, compress_level)
+        elif suffix == '.rgba':
+            write_raw_image(self.image, png_filepath)
+        else:
+            if key is not None and self._image is None:
+                # the export is cached on its own, so a missing decoded mipmap isn't stored too
+                self._image = self.cache.get_image(self.get_cache_key(0))
+                if self._image is None:
+                    self._image = self.decode_mipmap(0)
+            save_params = {"compress_level" : compress_level} if suffix == '.png' and compress_level is not None else {}
+            self.image.save(png_filepath, **save_params)
+        if key is not None:
+            self.cache.put_file(key, png_filepath)
+
+    def import_file(self, im_filepath : Path | Image.Image | bytes, size : tuple[int, int] = None):
+        """
+        im_filepath can also be an already decoded PIL image, or a raw RGBA buffer of the given (width, height) size.
+        .dds files are imported by import_dds, and .rgba files are read with their JSON sidecar (see RawImage).
+        """
+        if isinstance(im_filepath, Image.Image):
+            image = im_filepath
+        elif isinstance(im_filepath, (str, Path)) and Path(im_filepath).suffix.lower() == '.dds':
+            self.import_dds(im_filepath)
+            return
+        elif isinstance(im_filepath, (bytes, bytearray, memoryview)):
+            if size is None:
+                raise Exception("Error: importing a raw RGBA buffer requires its size")
+            image = Image.frombuffer('RGBA', size, im_filepath, 'raw', 'RGBA', 0, 1)
+        elif Path(im_filepath).suffix.lower() == '.rgba':
+            image = read_raw_image(im_filepath)
+        else:
+            image = Image.open(im_filepath)
+        self.image = image if image.mode == 'RGBA' else image.convert(mode='RGBA')
         self.header.width, self.header.height = self.image.size
+        if self.encode_cache is not None:
+            self.source_hash = get_image_hash(self.image)
+
+    def export_dds(self, dds_filepath : Path):
+        """
+        Writes the mipmaps as a DX10 DDS file of the same format, deswizzled but not decoded.
+        """
+        if self.image_replaced and not self.blocks_replaced:
+            self.encode_mipmaps()
+        elif self.header_only:
+            raise Exception(f"Error: {self.filepath} was opened in header-only mode and has no mipmap data to export")
+        width, height = self.header.width, self.header.height
+        DDS(width, height, self.header.format_id, [mipmap.get_blocks(width, height) for mipmap in self.mipmaps]).write(dds_filepath)
 
-    def encode_mipmaps(self):
+    def import_dds(self, dds_filepath : Path):
+        """
+        Imports a DDS file. When it stores the same kind of blocks as this texture and has enough mipmaps,
+        its blocks are only swizzled into the mipmaps ; otherwise its top level is decoded and re-encoded on save.
+        DDS files that can't be read as raw blocks are opened with PIL.
+        """
+        try:
+            dds = DDS.read(dds_filepath)
+        except Exception:
+            self.import_file(Image.open(dds_filepath))
+            return
+
+        tex_format = self.header.tex_format
+        if type(dds.tex_format) is type(tex_format) and dds.tex_format.block_size == tex_format.block_size and len(dds.mipmaps) >= len(self.mipmaps):
+            for mipmap, blocks in zip(self.mipmaps, dds.mipmaps):
+                mipmap.set_blocks(blocks, dds.width, dds.height)
+            self.header.width, self.header.height = dds.width, dds.height
+            # every mipmap now holds data, but not the one the cache and content hash were computed from
+            self.header_only = False
+            self.cache = None
+            self._image = None
+            self.image_replaced = True
+            self.blocks_replaced = True
+            return
+
+        decoded_data, pix_order = dds.tex_format.decode(dds.mipmaps[0], dds.width, dds.height)
+        self.import_file(Image.frombytes('RGBA', (dds.width, dds.height), decoded_data, 'raw', pix_order))
+
+    def get_mipmap_images(self) -> list[Image.Image]:
+        # each level is downsampled from the previous one instead of from the full size image
+        mipmap_images = [self.image]
+        for _ in range(1, len(self.mipmaps)):
+            mipmap_images.append(downsample(mipmap_images[-1], self.mipmap_filter))
+        return mipmap_images
+
+    def get_encoding_key(self) -> str:
+        if self.encode_cache is None or self.source_hash is None:
+            return None
+        header = self.header
+        return self.encode_cache.get_encoding_key(self.source_hash, header.format_id, header.platform, header.nsw_swizzle_mode, header.mipmap_count, self.encoder_preset, self.mipmap_filter)
+
+    def load_cached_mipmaps(self) -> bool:
+        key = self.get_encoding_key()
+        mipmaps_data = self.encode_cache.get_mipmaps(key) if key is not None else None
+        if mipmaps_data is None or len(mipmaps_data) != len(self.mipmaps):
+            return False
+        for mipmap, data in zip(self.mipmaps, mipmaps_data):
+            mipmap.update(data, mipmap.get_size(self.header.width, self.header.height)[0])
+        return True
+
+    def has_original_image(self) -> bool:
+        """
+        True when the imported image is pixel-identical to the top mipmap, which hasn't been replaced yet.
+        The top mipmap is only compared when it was decoded before the import, or is in the cache as a decoded mipmap
+        or as an exported PNG file (e.g. exported then imported back): decoding it just for the comparison would cost
+        as much as the decode the lazy import avoids.
+        """
+        if self.header_only or self.image.size != self.original_size:
+            return False
+        original_image = self._original_image
+        if original_image is None and self.cache is not None:
+            original_image = self.cache.get_image(self.get_cache_key(0))
+            if original_image is None:
+                original_image = self.cache.get_export_image(self.get_content_hash())
+        return original_image is not None and original_image.tobytes() == self.image.tobytes()
+
+    def encode_mipmaps(self, mipmap_images : list[Image.Image] = None):
+        """
+        mipmap_images are the already downsampled levels of the image (at least one per mipmap), e.g. shared by several textures.
+        """
+        if mipmap_images is None:
+            mipmap_images = self.get_mipmap_images()
+        elif len(mipmap_images) < len(self.mipmaps):
+            raise Exception(f"Error: {len(self.mipmaps)} mipmap images are needed, got {len(mipmap_images)}")
+        # the levels are independent ; the ASTC encoder releases the GIL, and large BC levels can be split over processes
+        with ThreadPoolExecutor(max_workers=self.encode_workers) as executor:
+            list(executor.map(lambda mipmap, mipmap_im: mipmap.encode(mipmap_im, self.encoder_preset, self.strip_workers), self.mipmaps, mipmap_images))
+        key = self.get_encoding_key()
+        if key is not None:
+            self.encode_cache.put_mipmaps(key, [mipmap.data for mipmap in self.mipmaps])
+
+    def has_same_blocks(self, other : "Tex") -> bool:
+        """
+        True when both textures store the same kind of compressed blocks, so their mipmap data can be copied
+        with only a change of swizzle.
+        """
+        tex_format, other_format = self.header.tex_format, other.header.tex_format
+        return type(tex_format) is type(other_format) and tex_format.block_size == other_format.block_size and tex_format.bytes_per_block == other_format.bytes_per_block
+
+    def import_blocks(self, other : "Tex"):
+        """
+        Replaces the mipmaps with the ones of other, deswizzled from its layout and swizzled into this texture's layout,
+        without decoding or encoding pixels. other must have the same blocks (see has_same_blocks) and at least as many mipmaps.
+        """
+        if not self.has_same_blocks(other):
+            raise Exception(f"Error: can't copy blocks of format {other.header.format_id:#x} into format {self.header.format_id:#x}")
+        if other.header.mipmap_count < self.header.mipmap_count:
+            raise Exception(f"Error: {other.filepath} has fewer mipmaps than {self.filepath}")
+        width, height = other.header.width, other.header.height
+        for mipmap, other_mipmap in zip(self.mipmaps, other.mipmaps):
+            mipmap.set_blocks(other_mipmap.get_blocks(width, height), width, height)
+        self.header.width, self.header.height = width, height
+        # as in import_dds, the mipmaps no longer hold the data the cache and content hash were computed from
+        self.header_only = False
+        self.cache = None
+        self._image = other._image
+        self.image_replaced = True
+        self.blocks_replaced = True
+
+    def write(self,tex_filepath : Path):
+        # mipmaps that were never accessed are read now, as tex_filepath may be the file they come from
+        mipmap_data = [mipmap.data for mipmap in self.mipmaps]
         offset : int = 0x28 + 0x10 * self.header.mipmap_count
-        for idx, mipmap in enumerate(self.mipmaps):
-            mipmap_im = self.image.reduce(2**idx)
+        for mipmap in self.mipmaps:
             mipmap.abs_offset = offset
-            mipmap.encode(mipmap_im)
             offset += mipmap.data_size
-            
-    def save(self,tex_filepath : Path):
-        self.encode_mipmaps()
+
         with LittleEndianBinaryFileWriter(tex_filepath) as f:
             self.header.write(f)
             for mipmap in self.mipmaps:
                 mipmap.write(f)
-            for mipmap in self.mipmaps:
-                f.write(mipmap.data)
+            for data in mipmap_data:
+                f.write(data)
+
+    def save(self,tex_filepath : Path, preset : str = None):
+        if preset is not None:
+            if preset not in encoder_presets:
+                raise Exception(f"Error: unknown encoder preset {preset}, expected one of {', '.join(encoder_presets)}")
+            self.encoder_preset = preset
+        # the mipmaps are only encoded for a new image, and neither the encode cache nor the original data can be used instead
+        if self.image_replaced and not self.blocks_replaced:
+            if not self.load_cached_mipmaps() and not self.has_original_image():
+                self.encode_mipmaps()
+        self.write(tex_filepath)
 
     def show(self):
-        self.image.show()
\ No newline at end of file
+        self.image.show()
@@ -0,0 +1,166 @@
+from pathlib import Path
+from PIL import Image
+import hashlib
+import shutil
+import struct
+import os
+
+def get_file_hash(filepath : Path) -> str:
+    file_hash = hashlib.blake2b(digest_size=20)
+    with open(filepath, mode='rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+def get_image_hash(image : Image.Image) -> str:
+    image_hash = hashlib.blake2b(f"{image.mode} {image.width} {image.height}".encode(), digest_size=20)
+    image_hash.update(image.tobytes())
+    return image_hash.hexdigest()
+
+class TexCache:
+    """
+    Disk cache of decoded textures, stored as PNG files named after the .tex content hash and the mipmap index,
+    and of the PNG files exported from them, per zlib level (see get_export_key).
+    Hits refresh the file modification time, and the least recently used files are removed once the cache
+    grows over max_size bytes. Several processes can share the same cache directory.
+    """
+    extension = "png"
+
+    def __init__(self, cache_dir : Path, max_size : int = 1024 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+        self.size_estimate : int = None
+
+    def get_key(self, content_hash : str, mipmap_idx : int) -> str:
+        return f"{content_hash}_{mipmap_idx}"
+
+    def get_export_key(self, content_hash : str, compress_level : int = None) -> str:
+        """
+        Key of a PNG file exported from the top mipmap at a zlib level (None: PIL's default) ; the decoded mipmaps
+        stored by put_image have keys of their own, as they are saved at level 1.
+        """
+        return f"{content_hash}_0_png{'default' if compress_level is None else compress_level}"
+
+    def get_path(self, key : str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.{self.extension}"
+
+    def get(self, key : str) -> Path:
+        cached_path = self.get_path(key)
+        try:
+            os.utime(cached_path)
+        except FileNotFoundError:
+            return None
+        return cached_path
+
+    def get_image(self, key : str) -> Image.Image:
+        cached_path = self.get(key)
+        if cached_path is None:
+            return None
+        try:
+            with Image.open(cached_path) as image:
+                image.load()
+                return image
+        except (OSError, ValueError):
+            return None
+
+    def get_export_image(self, content_hash : str) -> Image.Image:
+        """
+        Returns the top mipmap of a texture from any of its exported PNG files (see get_export_key), or None.
+        """
+        for compress_level in [None, *range(10)]:
+            image = self.get_image(self.get_export_key(content_hash, compress_level))
+            if image is not None:
+                return image
+        return None
+
+    def put_file(self, key : str, filepath : Path):
+        self._store(key, lambda tmp_path: shutil.copyfile(filepath, tmp_path))
+
+    def put_image(self, key : str, image : Image.Image):
+        self._store(key, lambda tmp_path: image.save(tmp_path, format='PNG', compress_level=1))
+
+    def _store(self, key : str, write_function):
+        cached_path = self.get_path(key)
+        cached_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cached_path.with_name(f"{cached_path.name}.{os.getpid()}.tmp")
+        write_function(tmp_path)
+        size = tmp_path.stat().st_size
+        os.replace(tmp_path, cached_path)
+
+        if self.size_estimate is None:
+            self.size_estimate = self.get_total_size()
+        else:
+            self.size_estimate += size
+        if self.size_estimate > self.max_size:
+            self.evict()
+
+    def _list_files(self) -> list[tuple[float, int, Path]]:
+        files = []
+        if self.cache_dir.is_dir():
+            for filepath in self.cache_dir.glob(f"*/*.{self.extension}"):
+                try:
+                    stat = filepath.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, filepath))
+        return files
+
+    def get_total_size(self) -> int:
+        return sum(size for _, size, _ in self._list_files())
+
+    def evict(self):
+        # evict down to 90% of the limit so that eviction doesn't run again on the next store
+        files = sorted(self._list_files())
+        total_size = sum(size for _, size, _ in files)
+        target_size = self.max_size * 0.9
+        for _, size, filepath in files:
+            if total_size <= target_size:
+                break
+            try:
+                filepath.unlink()
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        self.size_estimate = total_size
+
+    def clear(self):
+        if self.cache_dir.is_dir():
+            shutil.rmtree(self.cache_dir)
+        self.size_estimate = 0
+
+class TexEncodeCache(TexCache):
+    """
+    Disk cache of encoded mipmap payloads (as written in the .tex file), keyed by the source image hash and
+    everything that changes the encoding: format, platform, swizzle mode, mipmap count, encoder preset and mipmap filter.
+    """
+    extension = "bin"
+
+    def get_encoding_key(self, source_hash : str, format_id : int, platform : str, nsw_swizzle_mode : int, mipmap_count : int, preset : str, mipmap_filter : str) -> str:
+        params = f"{source_hash} {format_id} {platform} {nsw_swizzle_mode} {mipmap_count} {preset} {mipmap_filter}"
+        return hashlib.blake2b(params.encode(), digest_size=20).hexdigest()
+
+    def get_mipmaps(self, key : str) -> list[bytes]:
+        cached_path = self.get(key)
+        if cached_path is None:
+            return None
+        try:
+            data = cached_path.read_bytes()
+        except FileNotFoundError:
+            return None
+        mipmap_count = struct.unpack_from('<I', data)[0]
+        offset = 4 + 4 * mipmap_count
+        mipmaps = []
+        for size in struct.unpack_from(f'<{mipmap_count}I', data, 4):
+            mipmaps.append(data[offset:offset + size])
+            offset += size
+        if offset != len(data):
+            return None
+        return mipmaps
+
+    def put_mipmaps(self, key : str, mipmaps : list[bytes]):
+        def write_mipmaps(tmp_path : Path):
+            with open(tmp_path, mode='wb') as f:
+                f.write(struct.pack(f'<I{len(mipmaps)}I', len(mipmaps), *(len(data) for data in mipmaps)))
+                for data in mipmaps:
+                    f.write(data)
+        self._store(key, write_mipmaps)
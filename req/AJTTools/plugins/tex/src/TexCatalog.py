@@ -0,0 +1,188 @@
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import sqlite3
+import logging
+import struct
+import os
+import re
+
+from .Formats import formats, unsupported_formats
+from .TexHeader import platforms
+
+HEADER_STRUCT = struct.Struct('<4siHHhBBiiiiii')
+MIPMAP_STRUCT = struct.Struct('<iiii')
+# exported (.tex.<version>.png, .dds...) and other side files aren't textures
+TEX_NAME_PATTERN = re.compile(r'.*\.tex\.\d+')
+
+COLUMNS = ["path", "mtime_ns", "file_size", "version", "platform", "format_id", "format_name", "block_width", "block_height",
+           "width", "height", "mipmap_count", "nsw_swizzle_mode", "data_size", "error"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS textures (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    file_size INTEGER NOT NULL,
+    version INTEGER,
+    platform TEXT,
+    format_id INTEGER,
+    format_name TEXT,
+    block_width INTEGER,
+    block_height INTEGER,
+    width INTEGER,
+    height INTEGER,
+    mipmap_count INTEGER,
+    nsw_swizzle_mode INTEGER,
+    data_size INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS textures_format ON textures (format_id);
+CREATE INDEX IF NOT EXISTS textures_platform ON textures (platform);
+CREATE INDEX IF NOT EXISTS textures_size ON textures (width, height);
+"""
+
+def get_format_info(format_id : int) -> tuple[str, int, int]:
+    """
+    Returns the (name, block width, block height) of a format id ; the block size is None for unsupported formats.
+    """
+    if format_id in formats:
+        tex_format = formats[format_id]
+        block_width, block_height = tex_format.block_size
+        return type(tex_format).__name__, block_width, block_height
+    return unsupported_formats.get(format_id, f"UNKNOWN_{format_id:#x}"), None, None
+
+def read_tex_info(filepath : str) -> dict:
+    """
+    Reads the TexHeader and the mipmap table of a .tex file, without any mipmap data, into a catalog row
+    (everything but path, mtime_ns and file_size). Unlike TexHeader, unsupported formats don't raise.
+    """
+    with open(filepath, mode='rb') as f:
+        header_data = f.read(HEADER_STRUCT.size)
+        if len(header_data) < HEADER_STRUCT.size:
+            raise Exception("Error: truncated header")
+        magic, version, width, height, _, _, chunk, format_id, platform_id, _, _, nsw_swizzle_mode, _ = HEADER_STRUCT.unpack(header_data)
+        if magic != b'TEX\x00':
+            raise Exception(f'Error: Invalid magic ; expected "TEX\x00", got {magic}')
+        mipmap_count = chunk // 16
+        mipmap_table = f.read(MIPMAP_STRUCT.size * mipmap_count)
+        if len(mipmap_table) < MIPMAP_STRUCT.size * mipmap_count:
+            raise Exception("Error: truncated mipmap table")
+
+    # the last field of a mipmap entry is its data size (padded on Switch, unpadded on PS4)
+    data_size = sum(entry[3] for entry in MIPMAP_STRUCT.iter_unpack(mipmap_table))
+    format_name, block_width, block_height = get_format_info(format_id)
+    return {
+        "version" : version,
+        "platform" : platforms.get(platform_id, str(platform_id)),
+        "format_id" : format_id,
+        "format_name" : format_name,
+        "block_width" : block_width,
+        "block_height" : block_height,
+        "width" : width,
+        "height" : height,
+        "mipmap_count" : mipmap_count,
+        "nsw_swizzle_mode" : nsw_swizzle_mode,
+        "data_size" : data_size,
+        "error" : None,
+    }
+
+def _scan_file(item : tuple[str, str, int, int]) -> dict:
+    filepath, relative_path, mtime_ns, file_size = item
+    try:
+        row = read_tex_info(filepath)
+    except Exception as e:
+        row = dict.fromkeys(COLUMNS)
+        row["error"] = str(e)
+    row.update(path=relative_path, mtime_ns=mtime_ns, file_size=file_size)
+    return row
+
+def _list_tex_files(root_dir : Path) -> dict[str, tuple[str, int, int]]:
+    # relative posix path -> (filepath, mtime_ns, size) of every .tex.<version> file of the tree
+    tex_files = {}
+    stack = [(str(root_dir), '')]
+    while stack:
+        current_dir, current_relative_dir = stack.pop()
+        with os.scandir(current_dir) as it:
+            for entry in it:
+                if entry.is_dir():
+                    stack.append((entry.path, current_relative_dir + entry.name + '/'))
+                elif TEX_NAME_PATTERN.fullmatch(entry.name):
+                    stat = entry.stat()
+                    tex_files[current_relative_dir + entry.name] = (entry.path, stat.st_mtime_ns, stat.st_size)
+    return tex_files
+
+class TexCatalog:
+    """
+    SQLite index of the headers of every .tex file of a tree (format, block size, dimensions, mipmap count, platform, sizes),
+    so textures can be filtered without being opened. refresh() only reads the files that were added or changed
+    (by mtime and size) since the last refresh, and removes the ones that were deleted.
+    Paths are stored relative to root_dir, with forward slashes.
+    """
+    def __init__(self, root_dir : Path, db_path : Path, workers : int = None):
+        self.root_dir = Path(root_dir)
+        self.db_path = Path(db_path)
+        self.workers = workers
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def refresh(self) -> tuple[int, int]:
+        """
+        Updates the index from the tree ; returns the number of (re)scanned and removed files.
+        """
+        tex_files = _list_tex_files(self.root_dir)
+        indexed = {row["path"] : (row["mtime_ns"], row["file_size"]) for row in self.connection.execute("SELECT path, mtime_ns, file_size FROM textures")}
+
+        to_scan = [(filepath, relative_path, mtime_ns, file_size) for relative_path, (filepath, mtime_ns, file_size) in tex_files.items()
+                   if indexed.get(relative_path) != (mtime_ns, file_size)]
+        removed = [(relative_path,) for relative_path in indexed.keys() - tex_files.keys()]
+
+        # a header read is mostly waiting on the disk, so threads are enough to overlap the reads
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            rows = list(executor.map(_scan_file, to_scan))
+
+        with self.connection:
+            self.connection.executemany("DELETE FROM textures WHERE path = ?", removed)
+            self.connection.executemany(f"INSERT OR REPLACE INTO textures ({', '.join(COLUMNS)}) VALUES ({', '.join(':' + column for column in COLUMNS)})", rows)
+        logging.info(f"Texture catalog {self.db_path}: {len(tex_files)} files, {len(rows)} scanned, {len(removed)} removed")
+        return len(rows), len(removed)
+
+    def query(self, where : str = None, params : tuple = ()) -> list[sqlite3.Row]:
+        """
+        Returns the rows matching an SQL condition, e.g. query("format_name = ? AND width >= ?", ("BC7_UNORM", 2048)).
+        """
+        sql = "SELECT * FROM textures" + (f" WHERE {where}" if where else "") + " ORDER BY path"
+        return self.connection.execute(sql, params).fetchall()
+
+    def find(self, platform : str = None, format_name : str = None, block_size : tuple[int, int] = None,
+             min_width : int = None, min_height : int = None) -> list[sqlite3.Row]:
+        """
+        Returns the textures matching all the given criteria, e.g. ASTC 8x8 Switch textures of at least 1024x1024:
+        find(platform="nsw", format_name="ASTC_UNORM", block_size=(8, 8), min_width=1024, min_height=1024)
+        """
+        conditions, params = ["error IS NULL"], []
+        if platform is not None:
+            conditions.append("platform = ?")
+            params.append(platform)
+        if format_name is not None:
+            conditions.append("format_name = ?")
+            params.append(format_name)
+        if block_size is not None:
+            conditions.append("block_width = ? AND block_height = ?")
+            params.extend(block_size)
+        if min_width is not None:
+            conditions.append("width >= ?")
+            params.append(min_width)
+        if min_height is not None:
+            conditions.append("height >= ?")
+            params.append(min_height)
+        return self.query(" AND ".join(conditions), tuple(params))
@@ -1,36 +1,84 @@
 from pathlib import Path
-from .Tex import Tex
+from PIL import Image
+import logging
+from .Tex import Tex, downsample
+from .Formats import encoder_presets
 
 class TexConverter:
 
     @staticmethod
-    def PCtex_to_NSWtex(pc_tex_path: Path, switch_tex_path: Path, output_switch_tex_path: Path):
+    def convert(source_tex_path: Path, target_tex_path: Path, output_tex_path: Path):
         """
-        Конвертирует текстуру из PC формата в Nintendo Switch, используя промежуточный DDS.
+        Пересобирает целевую текстуру с изображением исходной.
+        Если обе текстуры используют один блочный формат, сжатые блоки только переставляются (swizzle), быстро и без потерь;
+        иначе декодированное изображение исходной текстуры передаётся в целевую в памяти и кодируется заново, без временных файлов.
         """
-        pc_tex = Tex(pc_tex_path)
-        temp_dds = pc_tex_path.with_suffix('.temp_export.dds')
-        pc_tex.export_file(str(temp_dds))
-
-        switch_tex = Tex(switch_tex_path)
-        switch_tex.import_file(str(temp_dds))
-        switch_tex.save(output_switch_tex_path)
+        source_tex = Tex(source_tex_path)
+        target_tex = Tex(target_tex_path, header_only=True)
+        if target_tex.has_same_blocks(source_tex):
+            try:
+                target_tex.import_blocks(source_tex)
+                target_tex.write(output_tex_path)
+                return
+            except Exception as e:
+                logging.warning(f"Block copy failed for {source_tex_path}, falling back to re-encoding: {e}")
+                target_tex = Tex(target_tex_path, header_only=True)
 
-        if temp_dds.exists():
-            temp_dds.unlink()
+        target_tex.import_file(source_tex.image)
+        target_tex.save(output_tex_path)
 
     @staticmethod
-    def NSWtex_to_PCtex(switch_tex_path: Path, pc_tex_path: Path, output_pc_tex_path: Path):
+    def build(source_path : Path | Image.Image, targets : list[tuple[Path, Path]], preset : str = "medium", mipmap_filter : str = "box", strip_workers : int = 1) -> int:
         """
-        Конвертирует текстуру из Nintendo Switch формата в PC, используя промежуточный DDS.
+        Собирает текстуры для нескольких платформ из одного изображения ; targets — пары (шаблон .tex, выходной файл).
+        Изображение открывается и уменьшается для мипмапов один раз, каждый вид блоков (формат и размер блока) кодируется один раз,
+        а в остальные шаблоны с теми же блоками сжатые блоки только переставляются (swizzle) под их платформу.
+        Возвращает число выполненных кодирований.
         """
-        switch_tex = Tex(switch_tex_path)
-        temp_dds = switch_tex_path.with_suffix('.temp_export.dds')
-        switch_tex.export_file(str(temp_dds))
+        if preset not in encoder_presets:
+            raise Exception(f"Error: unknown encoder preset {preset}, expected one of {', '.join(encoder_presets)}")
+        if isinstance(source_path, Image.Image):
+            image = source_path
+        else:
+            with Image.open(source_path) as source_image:
+                image = source_image.convert(mode='RGBA')
+        if image.mode != 'RGBA':
+            image = image.convert(mode='RGBA')
+
+        target_texs = [Tex(template_path, header_only=True) for template_path, _ in targets]
+        mipmap_images = [image]
+        for _ in range(1, max(tex.header.mipmap_count for tex in target_texs)):
+            mipmap_images.append(downsample(mipmap_images[-1], mipmap_filter))
 
-        pc_tex = Tex(pc_tex_path)
-        pc_tex.import_file(str(temp_dds))
-        pc_tex.save(output_pc_tex_path)
+        # the textures with the most mipmaps are encoded first, so that the others can take their blocks
+        encoded_texs : list[Tex] = []
+        for tex in sorted(target_texs, key=lambda tex: tex.header.mipmap_count, reverse=True):
+            tex.import_file(image)
+            source_tex = next((encoded_tex for encoded_tex in encoded_texs if tex.has_same_blocks(encoded_tex)), None)
+            if source_tex is not None:
+                tex.import_blocks(source_tex)
+                continue
+            tex.encoder_preset = preset
+            tex.mipmap_filter = mipmap_filter
+            tex.strip_workers = strip_workers
+            tex.encode_mipmaps(mipmap_images)
+            encoded_texs.append(tex)
+
+        for tex, (_, output_tex_path) in zip(target_texs, targets):
+            tex.write(output_tex_path)
+        logging.info(f"Built {len(targets)} textures with {len(encoded_texs)} encodes")
+        return len(encoded_texs)
+
+    @staticmethod
+    def PCtex_to_NSWtex(pc_tex_path: Path, switch_tex_path: Path, output_switch_tex_path: Path):
+        """
+        Конвертирует текстуру из PC формата в Nintendo Switch.
+        """
+        TexConverter.convert(pc_tex_path, switch_tex_path, output_switch_tex_path)
 
-        if temp_dds.exists():
-            temp_dds.unlink()
+    @staticmethod
+    def NSWtex_to_PCtex(switch_tex_path: Path, pc_tex_path: Path, output_pc_tex_path: Path):
+        """
+        Конвертирует текстуру из Nintendo Switch формата в PC.
+        """
+        TexConverter.convert(switch_tex_path, pc_tex_path, output_pc_tex_path)
@@ -1,8 +1,24 @@
 from ....io import LittleEndianBinaryFileReader, LittleEndianBinaryFileWriter
 from PIL import Image
-from .Formats import TexFormat
+from .Formats import TexFormat, encode_strips
 from .TexHeader import TexHeader
-from pyswizzle import nsw_swizzle, ps4_swizzle, nsw_deswizzle, ps4_deswizzle
+from .Swizzle import nsw_swizzle, ps4_swizzle, nsw_deswizzle, ps4_deswizzle
+import numpy as np
+
+# pixels decoded at once by decode_strips (rounded to the rows that can be deswizzled on their own)
+STRIP_DECODE_PIXELS = 1024 * 1024
+
+def resize_block_rows(data : bytes, row_size : int, new_row_size : int, new_row_count : int) -> bytes:
+    """
+    Crops or zero-pads linear block data (rows of row_size bytes) to new_row_count rows of new_row_size bytes.
+    """
+    row_count = len(data) // row_size
+    rows = np.frombuffer(data, dtype=np.uint8, count=row_count * row_size).reshape(row_count, row_size)
+    if row_size == new_row_size and row_count == new_row_count:
+        return data
+    resized_rows = np.zeros((new_row_count, new_row_size), dtype=np.uint8)
+    resized_rows[:min(row_count, new_row_count), :min(row_size, new_row_size)] = rows[:new_row_count, :new_row_size]
+    return resized_rows.tobytes()
 
 class TexMipmap:
     abs_offset : int
@@ -10,8 +26,76 @@ class TexMipmap:
     pitch : int
     tex_data_size : int
     data_size : int
-    data : bytes
     header : TexHeader
+    filepath : str = None # file the data is read from on first access ; None when the mipmap has no data to read
+    _data : bytes = None
+
+    @property
+    def data(self) -> bytes:
+        if self._data is None and self.filepath is not None:
+            with open(self.filepath, mode='rb') as f:
+                f.seek(self.abs_offset)
+                self._data = self.read_data(f)
+        return self._data
+
+    @data.setter
+    def data(self, data : bytes):
+        self._data = data
+
+    def read_data(self, f) -> bytes:
+        return f.read(self.data_size)
+
+    def read_data_range(self, offset : int, size : int) -> bytes:
+        """
+        Returns size bytes of the data from offset ; they are read from the file if the data hasn't been read yet,
+        so that a strip can be decoded without reading the whole level.
+        """
+        if self._data is not None or self.filepath is None:
+            data = self.data[offset:offset + size] if self.data is not None else b''
+        else:
+            with open(self.filepath, mode='rb') as f:
+                f.seek(self.abs_offset + offset)
+                data = f.read(size)
+        if len(data) != size:
+            raise Exception(f"Error: mipmap {self.idx} is too small for its block count")
+        return data
+
+    def get_decode_size(self, width : int, height : int) -> tuple[int, int]:
+        """
+        Size of the image the data of this level (width x height) decodes to, swizzle padding included.
+        """
+        return width, height
+
+    def get_strip_unit_rows(self) -> int:
+        """
+        Number of block rows that can be deswizzled on their own ; strips are made of whole units.
+        """
+        return 1
+
+    def get_strip_blocks(self, width : int, height : int, first_row : int, row_count : int) -> bytes:
+        """
+        Returns the linear blocks of row_count block rows from first_row, as wide as get_decode_size.
+        """
+        raise Exception("Unimplemented strip function")
+
+    def decode_strips(self, width : int, height : int, strip_pixels : int = STRIP_DECODE_PIXELS):
+        """
+        Yields the (y, image) strips of this level (width x height) from top to bottom. Each strip is read, deswizzled
+        and decoded on its own, so memory is bounded by the strip size instead of the level size.
+        """
+        tex_format = self.header.tex_format
+        block_height = tex_format.block_size[1]
+        decode_width, decode_height = self.get_decode_size(width, height)
+        unit_rows = self.get_strip_unit_rows()
+        rows_per_strip = max(1, strip_pixels // (decode_width * block_height * unit_rows)) * unit_rows
+        decode_row_count = -(-decode_height // block_height)
+        for first_row in range(0, -(-height // block_height), rows_per_strip):
+            row_count = min(rows_per_strip, decode_row_count - first_row)
+            y = first_row * block_height
+            strip_height = min(row_count * block_height, decode_height - y)
+            decoded_data, pix_order = tex_format.decode(self.get_strip_blocks(width, height, first_row, row_count), decode_width, strip_height)
+            strip = Image.frombytes('RGBA', (decode_width, strip_height), decoded_data, 'raw', (pix_order))
+            yield y, strip.crop((0, 0, width, min(strip_height, height - y)))
 
     def get_real_width_from_pitch(self, tex_format : TexFormat) -> int:
         if tex_format.pitch_type == 1: #BC textures
@@ -21,6 +105,16 @@ class TexMipmap:
         elif tex_format.pitch_type == 3:#other formats
             return (self.pitch * 8) // tex_format.bits_per_pixel
 
+    def get_size(self, width : int, height : int) -> tuple[int, int]:
+        """
+        Size of this mipmap level for a top level of width x height.
+        """
+        return max(1, width >> self.idx), max(1, height >> self.idx)
+
+    def get_block_count(self, width : int, height : int) -> tuple[int, int]:
+        block_width, block_height = self.header.tex_format.block_size
+        return -(-width // block_width), -(-height // block_height)
+
     def get_new_pitch_from_width(self, width : int, tex_format : TexFormat) -> int:
         if tex_format.pitch_type == 1:
             return (width * tex_format.bytes_per_block) // 4
@@ -30,27 +124,46 @@ class TexMipmap:
             return (tex_format.bits_per_pixel * width) // 8
         
 class SteamMipmap(TexMipmap):
-    def __init__(self, f : LittleEndianBinaryFileReader, header : TexHeader, idx : int):
+    def __init__(self, f : LittleEndianBinaryFileReader, header : TexHeader, idx : int, read_data : bool = True):
         self.abs_offset = f.readint32()
         self.padding = f.readint32()
         self.pitch = f.readint32()
         self.data_size = f.readint32()
-        pos = f.tell()
-        f.seek(self.abs_offset)
-        self.data = f.read(self.data_size)
-        f.seek(pos)
+        self.filepath = f.filepath if read_data else None
         self.header = header
         self.idx = idx
 
-    def encode(self, image : Image.Image):
+    def encode(self, image : Image.Image, preset : str = "medium", strip_workers : int = 1):
         rgba_data : bytes = image.tobytes()
-        encoded_data : bytes = self.header.tex_format.encode(rgba_data,image.width,image.height)
+        encoded_data : bytes = encode_strips(self.header.tex_format, rgba_data, image.width, image.height, preset, strip_workers)
         self.update(encoded_data, image.width)
 
     def decode(self, width : int, height : int) -> Image.Image:
         decoded_data, pix_order  = self.header.tex_format.decode(self.data, width, height)
         return Image.frombytes('RGBA',(width, height), decoded_data, 'raw', (pix_order))
 
+    def get_blocks(self, width : int, height : int) -> bytes:
+        """
+        Returns the compressed blocks of this level (top level: width x height) as linear, unpadded block rows.
+        """
+        column_count, row_count = self.get_block_count(*self.get_size(width, height))
+        row_size = column_count * self.header.tex_format.bytes_per_block
+        if len(self.data) < row_count * max(self.pitch, row_size):
+            raise Exception(f"Error: mipmap {self.idx} is too small for its block count")
+        return resize_block_rows(self.data, max(self.pitch, row_size), row_size, row_count)
+
+    def get_strip_blocks(self, width : int, height : int, first_row : int, row_count : int) -> bytes:
+        row_size = self.get_block_count(width, height)[0] * self.header.tex_format.bytes_per_block
+        stored_row_size = max(self.pitch, row_size)
+        data = self.read_data_range(first_row * stored_row_size, row_count * stored_row_size)
+        return resize_block_rows(data, stored_row_size, row_size, row_count)
+
+    def set_blocks(self, blocks : bytes, width : int, height : int):
+        """
+        Replaces this level (top level: width x height) with linear, unpadded block rows.
+        """
+        self.update(blocks, self.get_size(width, height)[0])
+
     def update(self, newdata : bytes, width : int):
         self.data = newdata
         self.data_size = len(newdata)
@@ -63,26 +176,33 @@ class SteamMipmap(TexMipmap):
         f.writeint32(self.data_size)
 
 class SwitchMipmap(TexMipmap):
-    def __init__(self, f : LittleEndianBinaryFileReader, header : TexHeader, idx : int):
+    def __init__(self, f : LittleEndianBinaryFileReader, header : TexHeader, idx : int, read_data : bool = True):
         self.abs_offset = f.readint32()
         self.padding = f.readint32()
         self.tex_data_size = f.readint32() #trailing zeroes are not in the tex file and are added in memory
         self.data_size = f.readint32() #padded (in memory) data size
-        pos = f.tell()
-        f.seek(self.abs_offset)
-        self.data = f.read(self.tex_data_size) + (self.data_size - self.tex_data_size) * b'\x00'
-        f.seek(pos)
+        self.filepath = f.filepath if read_data else None
         self.header = header
         self.idx = idx
         self.nsw_swizzle_mode = self.header.nsw_swizzle_mode - idx #shaky, but works
+
+    def read_data(self, f) -> bytes:
+        return f.read(self.tex_data_size) + (self.data_size - self.tex_data_size) * b'\x00'
+
+    def read_data_range(self, offset : int, size : int) -> bytes:
+        if self._data is not None or self.filepath is None:
+            return super().read_data_range(offset, size)
+        stored_size = max(0, min(size, self.tex_data_size - offset))
+        data = super().read_data_range(offset, stored_size) if stored_size > 0 else b''
+        return data + (size - stored_size) * b'\x00'
         
-    def encode(self, image : Image.Image):
+    def encode(self, image : Image.Image, preset : str = "medium", strip_workers : int = 1):
         width, height = image.size
         swizzle_width, swizzle_height = self.get_swizzle_size(width, height)
         padded_image = Image.new('RGBA',(swizzle_width,swizzle_height))
         padded_image.paste(image)
         rgba_data : bytes = padded_image.tobytes()
-        encoded_data : bytes = self.header.tex_format.encode(rgba_data,padded_image.width, padded_image.height)
+        encoded_data : bytes = encode_strips(self.header.tex_format, rgba_data, padded_image.width, padded_image.height, preset, strip_workers)
         swizzled_data = nsw_swizzle(encoded_data, padded_image.size, self.header.tex_format.block_size, self.header.tex_format.bytes_per_block, self.nsw_swizzle_mode)
         self.update(swizzled_data)
 
@@ -92,6 +212,40 @@ class SwitchMipmap(TexMipmap):
         decoded_data, pix_order  = self.header.tex_format.decode(deswizzled_data, swizzle_width, swizzle_height)
         return Image.frombytes('RGBA',(swizzle_width, swizzle_height), decoded_data, 'raw', (pix_order)).crop((0,0,width,height))
 
+    def get_blocks(self, width : int, height : int) -> bytes:
+        mipmap_width, mipmap_height = self.get_size(width, height)
+        swizzle_width, swizzle_height = self.get_swizzle_size(mipmap_width, mipmap_height)
+        tex_format = self.header.tex_format
+        swizzle_column_count, swizzle_row_count = self.get_block_count(swizzle_width, swizzle_height)
+        if len(self.data) != swizzle_column_count * swizzle_row_count * tex_format.bytes_per_block:
+            raise Exception(f"Error: unexpected data size for mipmap {self.idx}")
+        deswizzled_data = nsw_deswizzle(self.data, (swizzle_width, swizzle_height), tex_format.block_size, tex_format.bytes_per_block, self.nsw_swizzle_mode)
+        column_count, row_count = self.get_block_count(mipmap_width, mipmap_height)
+        return resize_block_rows(deswizzled_data, swizzle_column_count * tex_format.bytes_per_block, column_count * tex_format.bytes_per_block, row_count)
+
+    def get_decode_size(self, width : int, height : int) -> tuple[int, int]:
+        return self.get_swizzle_size(width, height)
+
+    def get_strip_unit_rows(self) -> int:
+        return 8 * 2 ** self.nsw_swizzle_mode # one row of GOB blocks
+
+    def get_strip_blocks(self, width : int, height : int, first_row : int, row_count : int) -> bytes:
+        # the swizzled data is stored tile row by tile row, so whole tile rows are contiguous
+        tex_format = self.header.tex_format
+        swizzle_width, _ = self.get_swizzle_size(width, height)
+        row_size = self.get_block_count(swizzle_width, height)[0] * tex_format.bytes_per_block
+        data = self.read_data_range(first_row * row_size, row_count * row_size)
+        return nsw_deswizzle(data, (swizzle_width, row_count * tex_format.block_size[1]), tex_format.block_size, tex_format.bytes_per_block, self.nsw_swizzle_mode)
+
+    def set_blocks(self, blocks : bytes, width : int, height : int):
+        mipmap_width, mipmap_height = self.get_size(width, height)
+        swizzle_width, swizzle_height = self.get_swizzle_size(mipmap_width, mipmap_height)
+        tex_format = self.header.tex_format
+        column_count, _ = self.get_block_count(mipmap_width, mipmap_height)
+        swizzle_column_count, swizzle_row_count = self.get_block_count(swizzle_width, swizzle_height)
+        padded_blocks = resize_block_rows(blocks, column_count * tex_format.bytes_per_block, swizzle_column_count * tex_format.bytes_per_block, swizzle_row_count)
+        self.update(nsw_swizzle(padded_blocks, (swizzle_width, swizzle_height), tex_format.block_size, tex_format.bytes_per_block, self.nsw_swizzle_mode))
+
     def get_swizzle_size(self, width : int, height : int) ->  tuple[int, int]:  
         chunk_width = 16 // self.header.tex_format.bytes_per_block * self.header.tex_format.block_size[0] * 4
         chunk_height = 8 * self.header.tex_format.block_size[1] * (2 ** self.nsw_swizzle_mode)
@@ -108,7 +262,7 @@ class SwitchMipmap(TexMipmap):
             
         return swizzle_width, swizzle_height
 
-    def update(self, newdata : bytes):
+    def update(self, newdata : bytes, width : int = None): #width is only there for the other platforms' pitch
         self.data = newdata
         self.data_size = len(newdata)
         self.tex_data_size = self.data_size #not bothering with that bs
@@ -120,27 +274,24 @@ class SwitchMipmap(TexMipmap):
         f.writeint32(self.data_size)
 
 class PS4Mipmap(TexMipmap):
-    def __init__(self,f : LittleEndianBinaryFileReader, header : TexHeader, idx : int):
+    def __init__(self,f : LittleEndianBinaryFileReader, header : TexHeader, idx : int, read_data : bool = True):
         self.header = header
         self.abs_offset = f.readint32()
         self.padding = f.readint32()
         self.pitch = f.readint32()
         self.unpadded_data_size = f.readint32() #this datasize weirdly don't take swizzle padding into account... so it's quite useless
-        swizzle_width, swizzle_height = self.get_swizzle_size(header.width, header.height) #can't really read lower mipmaps this way... need another solution
-        self.data_size = (swizzle_width * swizzle_height // (header.tex_format.block_size[0] * header.tex_format.block_size[1])) * header.tex_format.bytes_per_block #we calculate the real data size
-        pos = f.tell()
-        f.seek(self.abs_offset)
-        self.data = f.read(self.data_size)
-        f.seek(pos)
         self.idx = idx
+        swizzle_width, swizzle_height = self.get_swizzle_size(*self.get_size(header.width, header.height))
+        self.data_size = (swizzle_width * swizzle_height // (header.tex_format.block_size[0] * header.tex_format.block_size[1])) * header.tex_format.bytes_per_block #we calculate the real data size of this level
+        self.filepath = f.filepath if read_data else None
 
-    def encode(self, image : Image.Image):
+    def encode(self, image : Image.Image, preset : str = "medium", strip_workers : int = 1):
         width, height = image.size
         swizzle_width, swizzle_height = self.get_swizzle_size(width, height)
         padded_image = Image.new('RGBA',(swizzle_width,swizzle_height))
         padded_image.paste(image)
         rgba_data : bytes = padded_image.tobytes()
-        encoded_data : bytes = self.header.tex_format.encode(rgba_data, padded_image.width, padded_image.height)  
+        encoded_data : bytes = encode_strips(self.header.tex_format, rgba_data, padded_image.width, padded_image.height, preset, strip_workers)  
         swizzled_data = ps4_swizzle(encoded_data, padded_image.size, self.header.tex_format.block_size, self.header.tex_format.bytes_per_block)
         self.update(swizzled_data, image.width)
 
@@ -150,6 +301,41 @@ class PS4Mipmap(TexMipmap):
         decoded_data, pix_order  = self.header.tex_format.decode(deswizzled_data, swizzle_width, swizzle_height)
         return Image.frombytes('RGBA',(swizzle_width, swizzle_height), decoded_data, 'raw', (pix_order)).crop((0,0,width,height))
 
+    def get_blocks(self, width : int, height : int) -> bytes:
+        mipmap_width, mipmap_height = self.get_size(width, height)
+        swizzle_width, swizzle_height = self.get_swizzle_size(mipmap_width, mipmap_height)
+        tex_format = self.header.tex_format
+        swizzle_column_count, swizzle_row_count = self.get_block_count(swizzle_width, swizzle_height)
+        swizzle_data_size = swizzle_column_count * swizzle_row_count * tex_format.bytes_per_block
+        if len(self.data) < swizzle_data_size:
+            raise Exception(f"Error: unexpected data size for mipmap {self.idx}")
+        deswizzled_data = ps4_deswizzle(self.data[:swizzle_data_size], (swizzle_width, swizzle_height), tex_format.block_size, tex_format.bytes_per_block)
+        column_count, row_count = self.get_block_count(mipmap_width, mipmap_height)
+        return resize_block_rows(deswizzled_data, swizzle_column_count * tex_format.bytes_per_block, column_count * tex_format.bytes_per_block, row_count)
+
+    def get_decode_size(self, width : int, height : int) -> tuple[int, int]:
+        return self.get_swizzle_size(width, height)
+
+    def get_strip_unit_rows(self) -> int:
+        return 8 # one row of 8x8 block tiles
+
+    def get_strip_blocks(self, width : int, height : int, first_row : int, row_count : int) -> bytes:
+        # the swizzled data is stored tile row by tile row, so whole tile rows are contiguous
+        tex_format = self.header.tex_format
+        swizzle_width, _ = self.get_swizzle_size(width, height)
+        row_size = self.get_block_count(swizzle_width, height)[0] * tex_format.bytes_per_block
+        data = self.read_data_range(first_row * row_size, row_count * row_size)
+        return ps4_deswizzle(data, (swizzle_width, row_count * tex_format.block_size[1]), tex_format.block_size, tex_format.bytes_per_block)
+
+    def set_blocks(self, blocks : bytes, width : int, height : int):
+        mipmap_width, mipmap_height = self.get_size(width, height)
+        swizzle_width, swizzle_height = self.get_swizzle_size(mipmap_width, mipmap_height)
+        tex_format = self.header.tex_format
+        column_count, _ = self.get_block_count(mipmap_width, mipmap_height)
+        swizzle_column_count, swizzle_row_count = self.get_block_count(swizzle_width, swizzle_height)
+        padded_blocks = resize_block_rows(blocks, column_count * tex_format.bytes_per_block, swizzle_column_count * tex_format.bytes_per_block, swizzle_row_count)
+        self.update(ps4_swizzle(padded_blocks, (swizzle_width, swizzle_height), tex_format.block_size, tex_format.bytes_per_block), mipmap_width)
+
     def get_swizzle_size(self, width : int, height : int) ->  tuple[int, int]: 
         chunk_width = 8 * self.header.tex_format.block_size[0]
         chunk_height = 8 * self.header.tex_format.block_size[1]
@@ -175,4 +361,4 @@ class PS4Mipmap(TexMipmap):
         f.writeint32(self.abs_offset)
         f.writeint32(self.padding)
         f.writeint32(self.pitch)
-        f.writeint32(self.data_size)
\ No newline at end of file
+        f.writeint32(self.data_size)
@@ -1,2 +1,7 @@
 from .Tex import Tex
 from .TexConverter import TexConverter
+from .TexCache import TexCache, TexEncodeCache
+from .TexCatalog import TexCatalog
+from .DDS import DDS
+from .ContentIndex import ContentIndex
+from .Formats import encoder_presets
\ No newline at end of file
@@ -1 +1 @@
-from .utils import multiple_replace, relative_path, align_size, try_create_dir, should_export
\ No newline at end of file
+from .utils import multiple_replace, relative_path, align_size, try_create_dir, should_export, link_or_copy, break_hardlink
\ No newline at end of file
@@ -1,5 +1,7 @@
 import os
 import re
+import sys
+import shutil
 from pathlib import Path
 
 lang_exts = ['ja','en','de','fr','ko','it','es','zhcn','zhtw','ru','pl','nl','pt','ptbr','fi','sv','da','no','cs','hu','sk','ar','tr','bg','el','ro','th','ua','vi','id','cc','hi','es419']
@@ -38,3 +40,47 @@ def try_create_dir(filepath : str):
         os.makedirs(os.path.dirname(filepath))
     except:
         pass
+
+def break_hardlink(filepath : str):
+    """
+    Removes filepath when it is a hardlink shared with other paths (e.g. a deduplicated pak extraction),
+    so that writing it creates a file of its own instead of changing the data of every linked path.
+    """
+    try:
+        if os.stat(filepath, follow_symlinks=False).st_nlink > 1:
+            os.remove(filepath)
+    except FileNotFoundError:
+        pass
+
+def reflink(src_filepath : str, dst_filepath : str):
+    """
+    Copy-on-write clone of src_filepath (Linux FICLONE, e.g. btrfs/xfs). Raises OSError when unsupported.
+    """
+    if not sys.platform.startswith('linux'):
+        raise OSError("Reflinks are only supported on Linux")
+    import fcntl
+    FICLONE = 0x40049409
+    with open(src_filepath, mode='rb') as src, open(dst_filepath, mode='wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+def link_or_copy(src_filepath : str, dst_filepath : str) -> str:
+    """
+    Makes dst_filepath a hardlink of src_filepath, falling back to a reflink then to a plain copy.
+    Returns the method used ("hardlink", "reflink" or "copy").
+    """
+    try_create_dir(dst_filepath)
+    if os.path.lexists(dst_filepath):
+        os.remove(dst_filepath)
+    try:
+        os.link(src_filepath, dst_filepath)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        reflink(src_filepath, dst_filepath)
+        return "reflink"
+    except OSError:
+        if os.path.lexists(dst_filepath):
+            os.remove(dst_filepath)
+    shutil.copyfile(src_filepath, dst_filepath)
+    return "copy"
@@ -0,0 +1,46 @@
+import sys
+import struct
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+PLATFORM_IDS = {"stm" : -1, "nsw" : 1, "ps4" : 0xd}
+
+def generate_image(width : int, height : int, seed : int = 0) -> Image.Image:
+    """
+    Gradients with noise, so every block of the image is different.
+    """
+    y, x = np.mgrid[0:height, 0:width]
+    rgba = np.stack([x * 255 // max(1, width - 1), y * 255 // max(1, height - 1), (x * y) % 256, 255 - x % 64], axis=-1)
+    rgba = rgba + np.random.default_rng(seed).integers(0, 32, rgba.shape)
+    return Image.fromarray(np.clip(rgba, 0, 255).astype(np.uint8), 'RGBA')
+
+def write_template(template_path : Path, format_id : int, platform : str, width : int, height : int, mipmap_count : int = 1, nsw_swizzle_mode : int = 0):
+    """
+    Writes a .tex header and mipmap table without data, that Tex can open in header-only mode and save with a new image.
+    """
+    with open(template_path, mode='wb') as f:
+        f.write(struct.pack('<4siHHhBBiiiiii', b'TEX\x00', 143221013, width, height, 1, 1, mipmap_count * 16, format_id, PLATFORM_IDS[platform], 0, 0, nsw_swizzle_mode, 0))
+        for _ in range(mipmap_count):
+            f.write(struct.pack('<iiii', 0, 0, 0, 0))
+
+@pytest.fixture
+def make_tex(tmp_path):
+    """
+    Returns a function writing a texture of the given format and platform, encoded from generate_image.
+    """
+    from req.AJTTools.plugins.tex.src.Tex import Tex
+
+    def make_tex(name : str, format_id : int, platform : str, width : int, height : int, mipmap_count : int = 1, nsw_swizzle_mode : int = 0, seed : int = 0) -> Path:
+        tex_path = tmp_path / name
+        write_template(tex_path, format_id, platform, width, height, mipmap_count, nsw_swizzle_mode)
+        tex = Tex(tex_path, header_only=True)
+        tex.import_file(generate_image(width, height, seed))
+        tex.save(tex_path)
+        return tex_path
+
+    return make_tex
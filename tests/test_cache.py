@@ -0,0 +1,101 @@
+import os
+import shutil
+
+import pytest
+
+from req.AJTTools.plugins.tex import TexPlugin
+from req.AJTTools.plugins.tex.src.Tex import Tex
+from req.AJTTools.plugins.tex.src.TexCache import TexCache, TexEncodeCache
+
+from conftest import generate_image
+
+@pytest.mark.parametrize("export_format", ["png", "png_fast"])
+def test_reimported_export_keeps_original_data(make_tex, tmp_path, monkeypatch, export_format):
+    tex_path = make_tex("original.tex", 0x62, "stm", 64, 48, 3)
+    plugin = TexPlugin(cache_dir=tmp_path / 'cache', export_format=export_format)
+    plugin.export_file(tex_path, tmp_path / 'exported')
+
+    mod_path = tmp_path / 'mod.tex'
+    shutil.copyfile(tex_path, mod_path)
+    def encode_mipmaps(self, mipmap_images=None):
+        raise Exception("Error: the unchanged image was encoded again")
+    monkeypatch.setattr(Tex, "encode_mipmaps", encode_mipmaps)
+    plugin.import_file(mod_path, tmp_path / 'exported.png')
+    assert mod_path.read_bytes() == tex_path.read_bytes()
+
+def test_edited_export_is_encoded(make_tex, tmp_path):
+    tex_path = make_tex("original.tex", 0x62, "stm", 64, 48, 3)
+    plugin = TexPlugin(cache_dir=tmp_path / 'cache', encoder_preset="fastest")
+    plugin.export_file(tex_path, tmp_path / 'exported')
+    image = Tex(tex_path).image
+    image.paste((0, 0, 0, 255), (0, 0, 16, 16))
+    image.save(tmp_path / 'edited.png')
+
+    mod_path = tmp_path / 'mod.tex'
+    shutil.copyfile(tex_path, mod_path)
+    plugin.import_file(mod_path, tmp_path / 'edited.png')
+    assert mod_path.read_bytes() != tex_path.read_bytes()
+    assert Tex(mod_path).image.getpixel((4, 4))[:3] == (0, 0, 0)
+
+def test_encode_cache_hit_miss_and_eviction(tmp_path):
+    cache = TexEncodeCache(tmp_path / 'encode_cache', max_size=11000)
+    key = cache.get_encoding_key("source", 0x62, "stm", 0, 2, "medium", "box")
+    assert key != cache.get_encoding_key("source", 0x62, "stm", 0, 2, "fast", "box")
+    assert cache.get_mipmaps(key) is None
+
+    mipmaps = [b'\x01' * 3000, b'\x02' * 700, b'']
+    cache.put_mipmaps(key, mipmaps)
+    assert cache.get_mipmaps(key) == mipmaps
+
+    # a truncated entry is a miss
+    cache.get_path(key).write_bytes(cache.get_path(key).read_bytes()[:-1])
+    assert cache.get_mipmaps(key) is None
+
+    cache.put_mipmaps(key, mipmaps)
+    other_keys = [cache.get_encoding_key(f"other {idx}", 0x62, "stm", 0, 1, "medium", "box") for idx in range(3)]
+    for other_key in other_keys:
+        cache.put_mipmaps(other_key, [b'\x03' * 3000])
+    # the oldest entries are evicted down to 90% of the limit
+    assert cache.get_mipmaps(key) is None
+    assert all(cache.get_mipmaps(other_key) is not None for other_key in other_keys)
+    assert cache.get_total_size() <= 9900
+
+def test_tex_cache_hit_miss(tmp_path):
+    cache = TexCache(tmp_path / 'cache')
+    key = cache.get_key("content", 0)
+    assert cache.get(key) is None and cache.get_image(key) is None
+    image = generate_image(32, 16)
+    cache.put_image(key, image)
+    assert cache.get_image(key).tobytes() == image.tobytes()
+    assert cache.get_image(cache.get_key("content", 1)) is None
+
+    # files are written to a temporary file then moved into place, replacing the previous entry
+    other_image = generate_image(32, 16, seed=1)
+    cache.put_image(key, other_image)
+    assert cache.get_image(key).tobytes() == other_image.tobytes()
+    assert [path.name for path in (tmp_path / 'cache').rglob('*') if path.is_file()] == [f"{key}.png"]
+
+    exported_path = tmp_path / 'exported.png'
+    image.save(exported_path)
+    export_key = cache.get_export_key("content", 1)
+    cache.put_file(export_key, exported_path)
+    assert cache.get(export_key).read_bytes() == exported_path.read_bytes()
+    assert cache.get_export_image("content").tobytes() == image.tobytes()
+    assert cache.get_export_image("other") is None
+
+def test_tex_cache_evicts_least_recently_used(tmp_path):
+    data_path = tmp_path / 'data.bin'
+    data_path.write_bytes(b'\x00' * 1000)
+    cache = TexCache(tmp_path / 'cache', max_size=3500)
+    keys = [f"entry{idx}" for idx in range(4)]
+    for idx, key in enumerate(keys[:3]):
+        cache.put_file(key, data_path)
+        os.utime(cache.get_path(key), (idx, idx))
+    # a hit refreshes the modification time, so entry0 becomes the most recently used
+    assert cache.get(keys[0]) is not None
+    assert cache.get_path(keys[0]).stat().st_mtime > 2
+
+    # going over the limit evicts the oldest entries down to 90% of it
+    cache.put_file(keys[3], data_path)
+    assert [cache.get(key) is not None for key in keys] == [True, False, True, True]
+    assert cache.get_total_size() == 3000
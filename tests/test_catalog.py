@@ -0,0 +1,42 @@
+import os
+
+from req.AJTTools.plugins.tex.src.TexCatalog import TexCatalog, read_tex_info
+
+from conftest import write_template
+
+def test_catalog_refresh_and_find(make_tex, tmp_path):
+    root_dir = tmp_path / 'natives'
+    (root_dir / 'stm' / 'sub').mkdir(parents=True)
+    bc7_path = make_tex('natives/stm/bc7.tex.143221013', 0x62, "stm", 64, 32, 2)
+    make_tex('natives/stm/sub/astc.tex.143221013', 0x416, "nsw", 128, 64, 1, 1)
+    write_template(root_dir / 'stm' / 'unsupported.tex.143221013', 0x999, "ps4", 16, 16)
+    (root_dir / 'stm' / 'broken.tex.143221013').write_bytes(b'TEX\x00')
+    (root_dir / 'stm' / 'other.mesh').write_bytes(b'not a texture')
+    (root_dir / 'stm' / 'bc7.tex.143221013.png').write_bytes(b'exported')
+    (root_dir / 'stm' / 'bc7.tex.143221013.dds').write_bytes(b'exported')
+
+    with TexCatalog(root_dir, tmp_path / 'catalog.db', workers=2) as catalog:
+        assert catalog.refresh() == (4, 0)
+        assert catalog.refresh() == (0, 0)
+
+        rows = {row["path"] : row for row in catalog.query()}
+        assert sorted(rows) == ['stm/bc7.tex.143221013', 'stm/broken.tex.143221013', 'stm/sub/astc.tex.143221013', 'stm/unsupported.tex.143221013']
+        assert rows['stm/broken.tex.143221013']["error"] is not None
+        assert rows['stm/unsupported.tex.143221013']["format_name"] == "UNKNOWN_0x999"
+        bc7_row = rows['stm/bc7.tex.143221013']
+        assert (bc7_row["format_name"], bc7_row["block_width"], bc7_row["width"], bc7_row["height"], bc7_row["mipmap_count"]) == ("BC7_UNORM", 4, 64, 32, 2)
+        # 64x32 then 32x16 pixels, one byte per pixel in BC7
+        assert bc7_row["data_size"] == 64 * 32 + 32 * 16
+
+        astc_rows = catalog.find(platform="nsw", format_name="ASTC_UNORM", block_size=(8, 8), min_width=128)
+        assert [row["path"] for row in astc_rows] == ['stm/sub/astc.tex.143221013']
+        assert catalog.find(min_width=256) == []
+        assert len(catalog.find()) == 3
+
+        # a changed file is read again and a deleted one is dropped
+        make_tex('natives/stm/bc7.tex.143221013', 0x62, "stm", 32, 32)
+        os.utime(bc7_path, ns=(0, 0))
+        os.remove(root_dir / 'stm' / 'broken.tex.143221013')
+        assert catalog.refresh() == (1, 1)
+        assert [(row["width"], row["mipmap_count"]) for row in catalog.query("path = ?", ('stm/bc7.tex.143221013',))] == [(32, 1)]
+        assert read_tex_info(bc7_path)["data_size"] == 32 * 32
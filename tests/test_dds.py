@@ -0,0 +1,55 @@
+import numpy as np
+
+from req.AJTTools.plugins.tex.src.Tex import Tex
+from req.AJTTools.plugins.tex.src.DDS import DDS
+
+from conftest import write_template
+
+def get_blocks(tex : Tex) -> list[bytes]:
+    return [mipmap.get_blocks(tex.header.width, tex.header.height) for mipmap in tex.mipmaps]
+
+def test_dds_export_keeps_blocks(make_tex, tmp_path):
+    tex_path = make_tex("bc7.tex", 0x62, "nsw", 64, 128, 3, 2)
+    dds_path = tmp_path / "bc7.dds"
+    Tex(tex_path).export_dds(dds_path)
+
+    dds = DDS.read(dds_path)
+    assert (dds.width, dds.height) == (64, 128)
+    assert dds.mipmaps == get_blocks(Tex(tex_path))
+
+def test_dds_import_with_same_blocks_round_trips(make_tex, tmp_path):
+    tex_path = make_tex("bc7.tex", 0x62, "nsw", 64, 128, 3, 2)
+    dds_path = tmp_path / "bc7.dds"
+    Tex(tex_path).export_file(dds_path)
+
+    # the blocks are swizzled into the PS4 layout without being encoded again
+    template_path = tmp_path / "ps4.tex"
+    write_template(template_path, 0x62, "ps4", 64, 128, 3)
+    tex = Tex(template_path, header_only=True)
+    tex.import_file(dds_path)
+    tex.save(template_path)
+
+    imported_tex = Tex(template_path)
+    assert get_blocks(imported_tex) == get_blocks(Tex(tex_path))
+    assert imported_tex.image.tobytes() == Tex(tex_path).image.tobytes()
+
+def test_dds_import_with_other_blocks_is_encoded(make_tex, tmp_path):
+    tex_path = make_tex("bc1.tex", 0x47, "stm", 64, 64)
+    dds_path = tmp_path / "bc1.dds"
+    Tex(tex_path).export_file(dds_path)
+
+    template_path = tmp_path / "rgba.tex"
+    write_template(template_path, 0x1c, "stm", 64, 64)
+    tex = Tex(template_path, header_only=True)
+    tex.import_file(dds_path)
+    tex.save(template_path)
+    # RGBA8 stores the decoded BC1 pixels as they are
+    assert Tex(template_path).image.tobytes() == Tex(tex_path).image.tobytes()
+
+def test_dds_write_read(tmp_path):
+    mipmaps = [np.random.default_rng(idx).integers(0, 256, size, dtype=np.uint8).tobytes() for idx, size in enumerate([32 * 16, 8 * 16, 2 * 16])]
+    dds_path = tmp_path / "astc.dds"
+    DDS(64, 32, 0x416, mipmaps).write(dds_path) # ASTC 8x8: 8x4, 4x2 and 2x1 blocks
+    dds = DDS.read(dds_path)
+    assert (dds.width, dds.height, dds.format_id) == (64, 32, 0x416)
+    assert dds.mipmaps == mipmaps
@@ -0,0 +1,64 @@
+from pathlib import Path
+
+from PIL import Image
+
+from req.AJTTools.plugins.tex import TexPlugin
+from req.AJTTools.plugins.tex.src.Tex import Tex
+from req.AJTTools.plugins.tex.src.ContentIndex import ContentIndex, get_perceptual_hash
+
+from conftest import generate_image, write_template
+
+def test_content_index():
+    image = generate_image(64, 64)
+    retouched = image.copy()
+    retouched.putpixel((10, 10), (0, 0, 0, 255))
+    index = ContentIndex(perceptual=True)
+    index.add_image("a", image)
+    index.add_image("b", image.transpose(Image.Transpose.FLIP_LEFT_RIGHT))
+    index.add_image("c", image.copy())
+    index.add_image("d", retouched)
+
+    assert index.get_groups() == [["a", "c"], ["b"], ["d"]]
+    assert index.get_duplicates() == [["a", "c"]]
+    assert index.get_dedup_ratio() == 4 / 3
+    assert get_perceptual_hash(image) == get_perceptual_hash(image.copy())
+    assert index.get_similar(4) == [["a", "d"]]
+    assert index.get_similar(-1) == []
+    assert ContentIndex().get_dedup_ratio() == 1.0
+
+def test_dedup_import_matches_serial_import(tmp_path, monkeypatch):
+    # jobs are found relative to the extract directory name, from the working directory
+    monkeypatch.chdir(tmp_path)
+    root_dir = Path('root')
+    textures = { # texture: (format id, imported image seed)
+        'natives/stm/a.tex.143221013' : (0x62, 0),
+        'natives/stm/lang/a_ja.tex.143221013' : (0x62, 0),
+        'natives/stm/a_rgba.tex.143221013' : (0x1c, 0),
+        'natives/stm/b.tex.143221013' : (0x62, 1),
+    }
+    for texture, (format_id, seed) in textures.items():
+        (root_dir / texture).parent.mkdir(parents=True, exist_ok=True)
+        write_template(root_dir / texture, format_id, "stm", 64, 32, 2)
+        (Path('tex') / texture).parent.mkdir(parents=True, exist_ok=True)
+        generate_image(64, 32, seed).save(Path('tex') / (texture + '.png'))
+    # no texture to import into
+    Image.new('RGBA', (4, 4)).save(Path('tex/natives/stm/missing.tex.143221013.png'))
+
+    outputs = {}
+    for workers, dedup in [(1, True), (2, False), (2, True)]:
+        mod_dir = Path(f'mod_{workers}_{dedup}')
+        message = TexPlugin(workers=workers, encoder_preset="fastest", dedup=dedup).batch_import_file(root_dir, mod_dir, Path('tex'))
+        assert "5 files treated, with 4 successes and 1 errors" in message
+        # serial imports and parallel imports without dedup encode every file
+        assert ("5 imports, 4 encoded" in message) == (workers != 1 and dedup)
+        outputs[workers, dedup] = {texture : (mod_dir / texture).read_bytes() for texture in textures}
+    assert outputs[1, True] == outputs[2, False] == outputs[2, True]
+
+def test_import_mod_files_falls_back_to_import(make_tex, tmp_path):
+    # the blocks of a 2 mipmap texture can't be copied into a 3 mipmap one
+    first_path = make_tex('first.tex', 0x62, "stm", 64, 32, 2)
+    second_path = make_tex('second.tex', 0x62, "stm", 64, 32, 3)
+    generate_image(64, 32, seed=1).save(tmp_path / 'imported.png')
+    plugin = TexPlugin(encoder_preset="fastest")
+    assert plugin.import_mod_files([(first_path, first_path, tmp_path / 'imported.png'), (second_path, second_path, tmp_path / 'imported.png')]) == [None, None]
+    assert Tex(first_path).image.tobytes() == Tex(second_path).image.tobytes()
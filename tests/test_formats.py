@@ -0,0 +1,48 @@
+import sys
+import numpy as np
+import pytest
+
+from req.AJTTools.plugins.tex.src.Formats import formats, encode_strips
+
+from conftest import generate_image
+
+# channels each uncompressed format stores ; the others decode to 0, and alpha to 255
+STORED_CHANNELS = {
+    "R8G8B8A8_UNORM" : "rgba",
+    "B8G8R8A8_UNORM" : "rgba",
+    "B8G8R8X8_UNORM" : "rgb",
+    "R10G10B10A2_UNORM" : "rgb",
+    "R16G16B16A16_UNORM" : "rgba",
+    "R16G16_UNORM" : "rg",
+    "R16_UNORM" : "r",
+    "R8G8_UNORM" : "rg",
+    "R8_UNORM" : "r",
+    "A8_UNORM" : "a",
+}
+
+@pytest.mark.parametrize("format_name", list(STORED_CHANNELS))
+def test_uncompressed_round_trip(format_name):
+    tex_format = next(tex_format for tex_format in formats.values() if type(tex_format).__name__ == format_name)
+    width, height = 37, 21
+    rgba = np.asarray(generate_image(width, height)).reshape(-1, 4)
+    data = tex_format.encode(rgba.tobytes(), width, height)
+    assert len(data) == width * height * tex_format.bytes_per_block
+
+    decoded_data, pix_order = tex_format.decode(data, width, height)
+    decoded = np.frombuffer(decoded_data, dtype=np.uint8).reshape(-1, 4)[:, [pix_order.index(channel) for channel in "RGBA"]]
+    expected = np.zeros_like(rgba)
+    expected[:, 3] = 0xff
+    for channel in STORED_CHANNELS[format_name]:
+        expected[:, "rgba".index(channel)] = rgba[:, "rgba".index(channel)]
+    if format_name == "R10G10B10A2_UNORM":
+        # 2-bit alpha
+        expected[:, 3] = (rgba[:, 3].astype(np.uint32) * 3 + 127) // 255 * 85
+    assert np.array_equal(decoded, expected)
+
+@pytest.mark.parametrize("format_id", [0x62, 0x416]) # BC7 on processes, ASTC 8x8 on threads
+def test_encode_strips_match_single_encode(monkeypatch, format_id):
+    monkeypatch.setattr(sys.modules[encode_strips.__module__], "STRIP_MIN_PIXELS", 0)
+    tex_format = formats[format_id]
+    width, height = 96, 516 # the last strip is shorter, and ends with a partial ASTC block row
+    data = generate_image(width, height).tobytes()
+    assert encode_strips(tex_format, data, width, height, "fastest", workers=3) == tex_format.encode(data, width, height, "fastest")
@@ -0,0 +1,149 @@
+import os
+from pathlib import Path
+
+import random
+from req.AJTTools.plugins.pak.src.Pak import REPak, build_pak_from_dir, scan_pak_dir
+from req.AJTTools.plugins.pak.src.PakDiff import PakDiff
+
+def write_pak(work_dir : Path, files : dict[str, bytes]) -> tuple[Path, Path]:
+    """
+    Builds work_dir/data.pak from a natives/ tree of files (game path: content) and writes its release list.
+    """
+    source_dir = work_dir / 'source'
+    for gamepath, data in files.items():
+        filepath = source_dir / gamepath
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        filepath.write_bytes(data)
+    pak_path = work_dir / 'data.pak'
+    release_list_path = work_dir / 'data.list'
+    build_pak_from_dir(source_dir, pak_path, workers=2)
+    release_list_path.write_text('\n'.join(files), encoding='utf-8')
+    return pak_path, release_list_path
+
+def read_tree(root_dir : Path) -> dict[str, bytes]:
+    return {filepath.relative_to(root_dir).as_posix() : filepath.read_bytes() for filepath in root_dir.rglob('*') if filepath.is_file()}
+
+def test_unpack_dedup_links_duplicates(tmp_path):
+    files = {
+        'natives/stm/a.bin' : b'shared content' * 100,
+        'natives/stm/sub/b.bin' : b'shared content' * 100,
+        'natives/stm/c.bin' : b'unique content',
+    }
+    pak_path, release_list_path = write_pak(tmp_path / 'v1', files)
+    output_dir = tmp_path / 'out'
+    REPak(pak_path).unpack(output_dir, release_list_path, dedup=True)
+
+    assert read_tree(output_dir) == files
+    if os.stat(output_dir / 'natives/stm/a.bin').st_nlink > 1:
+        assert os.path.samefile(output_dir / 'natives/stm/a.bin', output_dir / 'natives/stm/sub/b.bin')
+
+def test_unpack_over_hardlinked_output(tmp_path):
+    v1_files = {
+        'natives/stm/a.bin' : b'version 1' * 100,
+        'natives/stm/b.bin' : b'version 1' * 100,
+    }
+    v2_files = {
+        'natives/stm/a.bin' : b'version 1' * 100,
+        'natives/stm/b.bin' : b'version 2' * 100,
+    }
+    v1_pak_path, v1_release_list_path = write_pak(tmp_path / 'v1', v1_files)
+    v2_pak_path, v2_release_list_path = write_pak(tmp_path / 'v2', v2_files)
+    for dedup in (True, False):
+        output_dir = tmp_path / f'out_{dedup}'
+        REPak(v1_pak_path).unpack(output_dir, v1_release_list_path, dedup=True)
+        REPak(v2_pak_path).unpack(output_dir, v2_release_list_path, dedup=dedup)
+        assert read_tree(output_dir) == v2_files
+
+def make_files() -> dict[str, bytes]:
+    rng = random.Random(0)
+    return {
+        'natives/stm/big.bin' : b'compressible ' * 5000,
+        'natives/stm/sub/random.bin' : rng.randbytes(3000),
+        'natives/stm/sub/deep/tex.tex' : b'TEX\x00' + rng.randbytes(500),
+        'natives/stm/stored.mp4' : b'\x00\x00\x00\x18ftyp' + rng.randbytes(200),
+        'natives/stm/empty.bin' : b'',
+    }
+
+def test_scan_pak_dir_largest_first(tmp_path):
+    pak_path, _ = write_pak(tmp_path, make_files())
+    sizes = [size for _, _, _, size in scan_pak_dir(tmp_path / 'source')]
+    assert sizes == sorted(sizes, reverse=True)
+    assert len(REPak(pak_path).entry_list) == len(make_files())
+
+def test_unpack_rebuild_round_trip(tmp_path):
+    files = make_files()
+    pak_path, release_list_path = write_pak(tmp_path, files)
+    assert {entry.compression_flag for entry in REPak(pak_path).entry_list} == {0, 1}
+
+    unpacked_dir = tmp_path / 'unpacked'
+    REPak(pak_path).unpack(unpacked_dir, release_list_path)
+    assert read_tree(unpacked_dir) == files
+
+    # entries missing from the release list come back as unknown/<hashes>.bin and must be packed under the same hashes
+    partial_list_path = tmp_path / 'partial.list'
+    partial_list_path.write_text('natives/stm/big.bin', encoding='utf-8')
+    partial_dir = tmp_path / 'partial'
+    REPak(pak_path).unpack(partial_dir, partial_list_path)
+    rebuilt_pak_path = tmp_path / 'rebuilt.pak'
+    build_pak_from_dir(partial_dir, rebuilt_pak_path, workers=3)
+
+    rebuilt_dir = tmp_path / 'rebuilt'
+    REPak(rebuilt_pak_path).unpack(rebuilt_dir, release_list_path)
+    assert read_tree(rebuilt_dir) == files
+
+def test_iter_entries_matches_unpack(tmp_path):
+    files = make_files()
+    pak_path, release_list_path = write_pak(tmp_path, files)
+    pak = REPak(pak_path)
+    for prefetch in (0, 1, 4):
+        entries = list(pak.iter_entries(release_list_path, prefetch=prefetch))
+        assert {path : data for path, _, data in entries} == files
+        offsets = [entry.offset for _, entry, _ in entries]
+        assert offsets == sorted(offsets)
+
+    selected = list(pak.iter_entries(release_list_path, entry_filter=lambda path, entry: path.endswith('.bin'), prefetch=2))
+    assert sorted(path for path, _, _ in selected) == sorted(path for path in files if path.endswith('.bin'))
+
+    unnamed = list(pak.iter_entries())
+    assert {path for path, _, _ in unnamed} == {entry.lowercase_path_hash for entry in pak.entry_list}
+
+def test_pak_diff(tmp_path):
+    old_files = {
+        'natives/stm/same.bin' : b'same' * 100,
+        'natives/stm/resized.bin' : b'old' * 100,
+        'natives/stm/edited.bin' : b'a' * 300,
+        'natives/stm/stored.mp4' : b'\x00\x00\x00\x18ftyp' + b'a' * 100,
+        'natives/stm/removed.bin' : b'removed',
+    }
+    new_files = {
+        'natives/stm/same.bin' : b'same' * 100,
+        'natives/stm/resized.bin' : b'new' * 101,
+        'natives/stm/edited.bin' : b'a' * 299 + b'b',
+        'natives/stm/stored.mp4' : b'\x00\x00\x00\x18ftyp' + b'b' * 100,
+        'natives/stm/added.bin' : b'added',
+    }
+    old_pak_path, release_list_path = write_pak(tmp_path / 'old', old_files)
+    new_pak_path, _ = write_pak(tmp_path / 'new', new_files)
+    release_list_path.write_text('\n'.join(old_files.keys() | new_files.keys()), encoding='utf-8')
+
+    diff = PakDiff(old_pak_path, new_pak_path, release_list_path)
+    assert diff.added == ['natives/stm/added.bin']
+    assert diff.removed == ['natives/stm/removed.bin']
+    assert diff.modified == ['natives/stm/edited.bin', 'natives/stm/resized.bin', 'natives/stm/stored.mp4']
+    # the resized entry is settled by its size, the other three need their content read
+    assert diff.content_compared_count == 3
+
+    # a patch pak loaded after the base pak overrides its entries
+    patch_pak_path, _ = write_pak(tmp_path / 'patch', {'natives/stm/edited.bin' : b'a' * 300})
+    diff = PakDiff(old_pak_path, [new_pak_path, patch_pak_path], release_list_path)
+    assert diff.modified == ['natives/stm/resized.bin', 'natives/stm/stored.mp4']
+
+    # paks opened from str and Path paths can be mixed
+    old_paks = [REPak(str(old_pak_path)), REPak(patch_pak_path)]
+    assert PakDiff(old_paks, new_pak_path, release_list_path).modified == ['natives/stm/edited.bin', 'natives/stm/resized.bin', 'natives/stm/stored.mp4']
+
+    report_path = tmp_path / 'report.txt'
+    diff.write_report(report_path)
+    report = report_path.read_text(encoding='utf-8')
+    assert 'Added (1):\nnatives/stm/added.bin\n' in report
+    assert 'Modified (2):\nnatives/stm/resized.bin\nnatives/stm/stored.mp4\n' in report
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from req.AJTTools.plugins.tex.src import Swizzle
+from req.AJTTools.plugins.tex.src.Swizzle import nsw_swizzle, nsw_deswizzle, ps4_swizzle, ps4_deswizzle, build_swizzle_table, get_swizzle_table
+
+# (image size, block size, bytes per block): RGBA8, BC1, BC7 and ASTC 8x8 layouts
+NSW_LAYOUTS = [((64, 32), (1, 1), 4), ((128, 64), (4, 4), 8), ((64, 128), (4, 4), 16), ((128, 128), (8, 8), 16)]
+PS4_LAYOUTS = [((16, 8), (1, 1), 4), ((64, 32), (4, 4), 8), ((32, 64), (4, 4), 16)]
+
+def get_data(im_size : tuple[int, int], block_size : tuple[int, int], bytes_per_block : int) -> bytes:
+    size = (im_size[0] * im_size[1]) // (block_size[0] * block_size[1]) * bytes_per_block
+    return np.random.default_rng(size).integers(0, 256, size, dtype=np.uint8).tobytes()
+
+def get_nsw_swizzle_modes(im_size : tuple[int, int], block_size : tuple[int, int]) -> list[int]:
+    row_count = im_size[1] // block_size[1]
+    return [swizzle_mode for swizzle_mode in range(5) if row_count % (8 * 2 ** swizzle_mode) == 0]
+
+@pytest.mark.parametrize("im_size, block_size, bytes_per_block", NSW_LAYOUTS)
+def test_nsw_round_trip(im_size, block_size, bytes_per_block):
+    data = get_data(im_size, block_size, bytes_per_block)
+    for swizzle_mode in get_nsw_swizzle_modes(im_size, block_size):
+        swizzled_data = nsw_swizzle(data, im_size, block_size, bytes_per_block, swizzle_mode)
+        assert swizzled_data != data
+        assert nsw_deswizzle(swizzled_data, im_size, block_size, bytes_per_block, swizzle_mode) == data
+
+@pytest.mark.parametrize("im_size, block_size, bytes_per_block", PS4_LAYOUTS)
+def test_ps4_round_trip(im_size, block_size, bytes_per_block):
+    data = get_data(im_size, block_size, bytes_per_block)
+    swizzled_data = ps4_swizzle(data, im_size, block_size, bytes_per_block)
+    assert swizzled_data != data
+    assert ps4_deswizzle(swizzled_data, im_size, block_size, bytes_per_block) == data
+
+@pytest.mark.parametrize("im_size, block_size, bytes_per_block", NSW_LAYOUTS)
+def test_nsw_matches_pyswizzle(im_size, block_size, bytes_per_block):
+    pyswizzle = pytest.importorskip("pyswizzle")
+    data = get_data(im_size, block_size, bytes_per_block)
+    for swizzle_mode in get_nsw_swizzle_modes(im_size, block_size):
+        assert nsw_swizzle(data, im_size, block_size, bytes_per_block, swizzle_mode) == bytes(pyswizzle.nsw_swizzle(data, im_size, block_size, bytes_per_block, swizzle_mode))
+        assert nsw_deswizzle(data, im_size, block_size, bytes_per_block, swizzle_mode) == pyswizzle.nsw_deswizzle(data, im_size, block_size, bytes_per_block, swizzle_mode)
+
+@pytest.mark.parametrize("im_size, block_size, bytes_per_block", PS4_LAYOUTS)
+def test_ps4_matches_pyswizzle(im_size, block_size, bytes_per_block):
+    pyswizzle = pytest.importorskip("pyswizzle")
+    data = get_data(im_size, block_size, bytes_per_block)
+    assert ps4_swizzle(data, im_size, block_size, bytes_per_block) == bytes(pyswizzle.ps4_swizzle(data, im_size, block_size, bytes_per_block))
+    assert ps4_deswizzle(data, im_size, block_size, bytes_per_block) == pyswizzle.ps4_deswizzle(data, im_size, block_size, bytes_per_block)
+
+def test_unpadded_size_raises():
+    with pytest.raises(Exception):
+        ps4_swizzle(get_data((12, 8), (1, 1), 4), (12, 8), (1, 1), 4)
+
+def test_swizzle_table_memory():
+    tracemalloc.start()
+    try:
+        table = build_swizzle_table('ps4', (1024, 1024), (1, 1), 4)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert table.dtype == np.int32
+    assert peak < table.nbytes * 1.1
+
+def test_swizzle_table_cache_is_bounded_by_size(monkeypatch):
+    monkeypatch.setattr(Swizzle, "swizzle_tables", OrderedDict())
+    monkeypatch.setattr(Swizzle, "swizzle_tables_size", 0)
+    # each 4096 pixel RGBA8 table is 16 KiB
+    monkeypatch.setattr(Swizzle, "SWIZZLE_TABLE_CACHE_BYTES", 40 * 1024)
+    first_table = get_swizzle_table('ps4', (64, 64), (1, 1), 4)
+    assert get_swizzle_table('ps4', (64, 64), (1, 1), 4) is first_table
+    assert not first_table.flags.writeable
+    get_swizzle_table('ps4', (32, 128), (1, 1), 4)
+    get_swizzle_table('ps4', (64, 64), (1, 1), 4) # most recently used again
+    get_swizzle_table('ps4', (128, 32), (1, 1), 4)
+    assert list(Swizzle.swizzle_tables) == [('ps4', (64, 64), (1, 1), 4, 0), ('ps4', (128, 32), (1, 1), 4, 0)]
+    assert Swizzle.swizzle_tables_size == 32 * 1024
+    # tables over the limit are built but not kept
+    get_swizzle_table('ps4', (128, 128), (1, 1), 4)
+    assert len(Swizzle.swizzle_tables) == 2
@@ -0,0 +1,75 @@
+import pytest
+from PIL import Image
+
+from req.AJTTools.plugins.tex.src.Tex import Tex, downsample
+
+from conftest import generate_image
+
+# (format id, platform, width, height, swizzle mode): RGBA8, BC1, BC7 and ASTC 8x8 on every platform layout,
+# with sizes that need padding to the block and swizzle tile sizes
+STRIP_TEXTURES = [
+    (0x1c, "stm", 100, 70, 0),
+    (0x47, "stm", 128, 96, 0),
+    (0x62, "ps4", 72, 136, 0),
+    (0x1c, "ps4", 50, 90, 0),
+    (0x47, "nsw", 120, 200, 1),
+    (0x62, "nsw", 64, 256, 2),
+    (0x416, "nsw", 96, 160, 1),
+]
+
+@pytest.mark.parametrize("format_id, platform, width, height, nsw_swizzle_mode", STRIP_TEXTURES)
+def test_decode_strips_match_full_decode(make_tex, format_id, platform, width, height, nsw_swizzle_mode):
+    tex = Tex(make_tex("strips.tex", format_id, platform, width, height, 2, nsw_swizzle_mode))
+    for mipmap in tex.mipmaps:
+        mipmap_width, mipmap_height = mipmap.get_size(width, height)
+        full_image = mipmap.decode(mipmap_width, mipmap_height)
+        # the smallest strip_pixels gives one strip per group of rows that can be deswizzled on their own
+        for strip_pixels in (1, 32 * 32, 1 << 30):
+            image = Image.new('RGBA', (mipmap_width, mipmap_height))
+            row_count = 0
+            for y, strip in mipmap.decode_strips(mipmap_width, mipmap_height, strip_pixels):
+                assert y == row_count
+                image.paste(strip, (0, y))
+                row_count += strip.height
+            assert row_count == mipmap_height
+            assert image.tobytes() == full_image.tobytes()
+
+@pytest.mark.parametrize("suffix", [".png", ".rgba"])
+def test_export_strips_match_image(make_tex, tmp_path, suffix):
+    tex_path = make_tex("export.tex", 0x47, "ps4", 136, 72)
+    export_path = tmp_path / f"export{suffix}"
+    Tex(tex_path).export_strips(export_path)
+    tex = Tex(tex_path)
+    tex.import_file(export_path)
+    assert tex.image.tobytes() == Tex(tex_path).image.tobytes()
+
+def test_mipmap_sizes_match_header(make_tex):
+    # odd sizes: the generated mip chain and the header sizes both round down
+    for platform in ("stm", "ps4", "nsw"):
+        tex = Tex(make_tex(f"{platform}.tex", 0x1c, platform, 37, 21, 4, 3))
+        image = generate_image(37, 21)
+        for idx, mipmap in enumerate(tex.mipmaps):
+            assert mipmap.get_size(37, 21) == image.size == (max(1, 37 >> idx), max(1, 21 >> idx))
+            assert tex.load_pil_image(idx).tobytes() == image.tobytes()
+            image = downsample(image, "box")
+
+@pytest.mark.parametrize("max_size, mipmap_idx, thumbnail_size", [
+    ((64, 64), 2, (64, 16)), # a mipmap of exactly the thumbnail size is returned as is
+    ((100, 100), 1, (100, 25)), # the smallest mipmap at least as large, scaled down
+    ((512, 512), 0, (256, 64)), # never scaled up
+    ((256, 8), 3, (32, 8)),
+])
+def test_thumbnail_mipmap_and_size(make_tex, max_size, mipmap_idx, thumbnail_size):
+    tex = Tex(make_tex("thumbnail.tex", 0x1c, "stm", 256, 64, 4))
+    loaded_mipmaps = []
+    load_pil_image = tex.load_pil_image
+    def record_load(idx):
+        loaded_mipmaps.append(idx)
+        return load_pil_image(idx)
+    tex.load_pil_image = record_load
+
+    thumbnail = tex.get_thumbnail(max_size)
+    assert loaded_mipmaps == [mipmap_idx]
+    assert thumbnail.size == thumbnail_size
+    if thumbnail_size == tex.mipmaps[mipmap_idx].get_size(256, 64):
+        assert thumbnail.tobytes() == load_pil_image(mipmap_idx).tobytes()